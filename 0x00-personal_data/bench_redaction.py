@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Benchmark the PII redaction implementations on synthetic log lines
+"""
+
+import argparse
+import csv
+import importlib.util
+import io
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import re
+import subprocess
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import filtered_logger
+from redact_table import ColumnRedactor
+
+TEMPLATES = 16
+HERE = os.path.dirname(os.path.abspath(__file__))
+LENGTHS = (80, 400, 2000)
+FIELD_COUNTS = (5, 500, 5000)
+DENSITIES = (0.1, 0.5, 0.9)
+NON_PII_KEYS = ("ip", "last_login", "user_agent")
+TABLE_BATCH_SIZE = 1000
+
+
+def _load_legacy():
+    """Import filtered_logger-o.py, whose name is not a valid module name"""
+    spec = importlib.util.spec_from_file_location(
+        "filtered_logger_o", os.path.join(HERE, "filtered_logger-o.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _records(lines: Sequence[str]) -> List[logging.LogRecord]:
+    """Wrap log lines into records for the formatter implementations"""
+    return [logging.LogRecord("user_data", logging.INFO, __file__, 0, line,
+                              None, None) for line in lines]
+
+
+def _templated(lines: Sequence[str]) -> List[logging.LogRecord]:
+    """Turn log lines into records built from a few message templates
+
+    Each value becomes a %s argument, and the records cycle through the
+    templates of the first TEMPLATES lines, as a real logger would.
+    """
+    shapes = []
+    for line in lines[:TEMPLATES]:
+        template = re.sub(r"=([^;]*);", "=%s;", line.replace("%", "%%"))
+        shapes.append((template, tuple(re.findall(r"=([^;]*);", line))))
+    return [logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                              *shapes[i % len(shapes)], None)
+            for i in range(len(lines))]
+
+
+def _encoded(lines: Sequence[str]) -> List[bytes]:
+    """Encode log lines for the bytes implementations"""
+    return [line.encode() for line in lines]
+
+
+def _implementations(fields: Sequence[str]) -> Dict[str, Tuple[
+        Callable, Callable]]:
+    """Return (prepare, redact) pairs for every redaction implementation
+
+    ``prepare`` turns the log lines into the inputs ``redact`` consumes,
+    outside of the timed section.
+    """
+    legacy = _load_legacy()
+    formatter = filtered_logger.RedactingFormatter(list(fields))
+    legacy_formatter = legacy.RedactingFormatter(list(fields))
+    fields = tuple(fields)
+    scratch = bytearray(1 << 16)
+    return {
+        "filter_datum": (list, lambda line: filtered_logger.filter_datum(
+            fields, "***", line, ";")),
+        "Redactor": (list, filtered_logger.Redactor(fields, "***", ";")),
+        "filter_datum_bytes": (_encoded, lambda raw:
+                               filtered_logger.filter_datum_bytes(
+                                   fields, b"***", raw, ";", scratch)),
+        "filter_datum-o": (list, lambda line: legacy.filter_datum(
+            fields, "***", line, ";")),
+        "RedactingFormatter": (_records, formatter.format),
+        "RedactingFormatter-template": (_templated, formatter.format),
+        "RedactingFormatter-o": (_records, legacy_formatter.format),
+    }
+
+
+def load_profiles(path: str) -> List[Dict[str, str]]:
+    """Read user_data.csv-shaped records to draw field values from"""
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def make_lines(profiles: List[Dict[str, str]], fields: Sequence[str],
+               length: int, density: float, count: int,
+               seed: int = 0) -> List[str]:
+    """Generate key=value; log lines of about ``length`` characters
+
+    ``density`` is the share of key=value pairs whose key is one of the
+    redacted ``fields``.
+    """
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        profile = rng.choice(profiles)
+        pairs = []
+        size = 0
+        while size < length:
+            if rng.random() < density:
+                key = rng.choice(fields)
+            else:
+                key = rng.choice(NON_PII_KEYS + ("attr_%d" % len(pairs),))
+            value = profile.get(key) or "v%08x" % rng.getrandbits(32)
+            pair = f"{key}={value};"
+            pairs.append(pair)
+            size += len(pair)
+        lines.append("".join(pairs))
+    return lines
+
+
+def field_names(count: int) -> List[str]:
+    """Return the PII fields padded with synthetic names up to ``count``"""
+    fields = list(filtered_logger.PII_FIELDS[:count])
+    fields.extend(f"pii_{i}" for i in range(count - len(fields)))
+    return fields
+
+
+def measure(redact: Callable, inputs: list, repeat: int) -> Dict[str, float]:
+    """Time ``redact`` over the inputs and trace its transient allocations"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in inputs:
+            redact(item)
+        best = min(best, time.perf_counter() - start)
+
+    sample = inputs[:min(len(inputs), 200)]
+    tracemalloc.start()
+    total = 0
+    for item in sample:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        redact(item)
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return {
+        "lines_per_sec": len(inputs) / best if best else 0.0,
+        "peak_alloc_bytes_per_line": total / len(sample) if sample else 0.0,
+    }
+
+
+def git_commit() -> str:
+    """Return the commit the benchmark runs against, if known"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(profiles: List[Dict[str, str]], lines: int, repeat: int,
+        only: Sequence[str] = None,
+        field_counts: Sequence[int] = FIELD_COUNTS) -> List[Dict]:
+    """Benchmark every implementation on every scenario"""
+    results = []
+    for count, length, density in itertools.product(
+            field_counts, LENGTHS, DENSITIES):
+        fields = field_names(count)
+        messages = make_lines(profiles, fields, length, density, lines)
+        for name, (prepare, redact) in _implementations(fields).items():
+            if only and name not in only:
+                continue
+            result = {"implementation": name, "fields": count,
+                      "length": length, "density": density}
+            result.update(measure(redact, prepare(messages), repeat))
+            results.append(result)
+    return results
+
+
+def run_tabular(profiles: List[Dict[str, str]], rows: int,
+                repeat: int) -> List[Dict]:
+    """Compare per-row filter_datum with column-wise table redaction
+
+    Both paths turn batches of user rows into redacted key=value lines.
+    """
+    rng = random.Random(0)
+    columns = list(profiles[0])
+    table = [tuple(rng.choice(profiles)[column] for column in columns)
+             for _ in range(rows)]
+    batches = [table[i:i + TABLE_BATCH_SIZE]
+               for i in range(0, len(table), TABLE_BATCH_SIZE)]
+    fields = list(filtered_logger.PII_FIELDS)
+    redactor = ColumnRedactor(columns)
+
+    def per_row(batch: List[Tuple]) -> None:
+        """Render each row and redact it with filter_datum"""
+        out = io.StringIO()
+        for row in batch:
+            line = "".join(f"{column}={value};"
+                           for column, value in zip(columns, row))
+            out.write(filtered_logger.filter_datum(fields, "***", line, ";")
+                      + "\n")
+
+    def columnar(batch: List[Tuple]) -> None:
+        """Mask the PII columns of the whole batch at once"""
+        redactor.write_kv(batch, io.StringIO())
+
+    results = []
+    for name, redact in (("filter_datum per row", per_row),
+                         ("ColumnRedactor", columnar)):
+        result = measure(redact, batches, repeat)
+        results.append({
+            "implementation": name, "rows": rows,
+            "rows_per_sec": result["lines_per_sec"] * len(table) /
+            len(batches),
+            "peak_alloc_bytes_per_row": result["peak_alloc_bytes_per_line"]
+            / TABLE_BATCH_SIZE,
+        })
+    return results
+
+
+def _key(result: Dict) -> Tuple:
+    """Identify a result across runs"""
+    return (result["implementation"], result["fields"], result["length"],
+            result["density"])
+
+
+def compare(results: List[Dict], baseline_path: str) -> None:
+    """Print the throughput change against a previous JSON report"""
+    with open(baseline_path) as f:
+        baseline = {_key(result): result for result in json.load(f)[
+            "results"]}
+    for result in results:
+        old = baseline.get(_key(result))
+        if old is None or not old["lines_per_sec"]:
+            continue
+        ratio = result["lines_per_sec"] / old["lines_per_sec"]
+        print("{:<28} fields={:<5} length={:<5} density={:<4} x{:.2f}"
+              .format(*_key(result), ratio))
+
+
+def main(argv: List[str] = None) -> None:
+    """Parse the command line, run the benchmark and save the report"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--profiles",
+                        default=os.path.join(HERE, "user_data.csv"),
+                        help="CSV of user records to draw values from")
+    parser.add_argument("-n", "--lines", type=int, default=2000)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-i", "--implementation", action="append",
+                        help="only run this implementation (repeatable)")
+    parser.add_argument("-f", "--field-counts", default=",".join(
+                            str(count) for count in FIELD_COUNTS),
+                        help="comma separated numbers of redacted fields")
+    parser.add_argument("-t", "--tabular", action="store_true",
+                        help="benchmark table exports instead of log lines")
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    parser.add_argument("--compare", metavar="JSON",
+                        help="previous report to compare throughput with")
+    args = parser.parse_args(argv)
+
+    if args.tabular:
+        results = run_tabular(load_profiles(args.profiles), args.lines,
+                              args.repeat)
+        for result in results:
+            print("{implementation:<28} {rows_per_sec:>12.0f} rows/sec "
+                  "{peak_alloc_bytes_per_row:>10.0f} B/row".format(**result))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"commit": git_commit(),
+                           "python": platform.python_version(),
+                           "tabular": results}, f, indent=2)
+        return
+
+    field_counts = [int(count) for count in args.field_counts.split(",")]
+    results = run(load_profiles(args.profiles), args.lines, args.repeat,
+                  args.implementation, field_counts)
+    for result in results:
+        print("{implementation:<28} fields={fields:<5} length={length:<5} "
+              "density={density:<4} {lines_per_sec:>12.0f} lines/sec "
+              "{peak_alloc_bytes_per_line:>10.0f} B/line".format(**result))
+    report = {"commit": git_commit(), "python": platform.python_version(),
+              "lines": args.lines, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Bulk load user_data.csv dumps into the users table
+"""
+
+import argparse
+import csv
+import functools
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator, List, Sequence, Tuple
+
+from filtered_logger import get_db
+
+BATCH_SIZE = 5000
+
+
+def read_header(path: str) -> List[str]:
+    """Return the column names from the first line of a CSV dump"""
+    with open(path, newline="") as f:
+        columns = next(csv.reader(f))
+    for column in columns:
+        if not re.fullmatch(r"\w+", column):
+            raise ValueError(f"invalid column name: {column!r}")
+    return columns
+
+
+def file_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """Split the rows of a CSV dump into newline-aligned byte ranges
+
+    Rows are assumed to hold no quoted newlines, as in the users dumps.
+    """
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        bounds = [start]
+        for i in range(1, parts):
+            f.seek(max(start + (size - start) * i // parts, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+        bounds.append(size)
+    return [(low, high) for low, high in zip(bounds, bounds[1:])
+            if low < high]
+
+
+def read_rows(path: str, start: int, end: int) -> Iterator[List[str]]:
+    """Stream the CSV rows stored between two byte offsets"""
+    with open(path, "rb") as f:
+        f.seek(start)
+
+        def lines() -> Iterator[str]:
+            """Yield decoded lines until the end offset is reached"""
+            while f.tell() < end:
+                line = f.readline()
+                if not line:
+                    return
+                yield line.decode("utf-8")
+
+        yield from csv.reader(lines())
+
+
+def load_range(connect: Callable[[], Any], path: str, start: int, end: int,
+               columns: Sequence[str], batch_size: int = BATCH_SIZE) -> int:
+    """Insert one byte range of a CSV dump, committing every batch"""
+    conn = connect()
+    if conn is None:
+        raise RuntimeError("could not connect to the database")
+    placeholder = "?" if isinstance(conn, sqlite3.Connection) else "%s"
+    query = "INSERT INTO users ({}) VALUES ({})".format(
+        ", ".join(columns), ", ".join([placeholder] * len(columns)))
+    count = 0
+    try:
+        cursor = conn.cursor()
+        batch = []
+        for row in read_rows(path, start, end):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(query, batch)
+                conn.commit()
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(query, batch)
+            conn.commit()
+            count += len(batch)
+        cursor.close()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return count
+
+
+def bulk_load(connect: Callable[[], Any], path: str, workers: int = 1,
+              batch_size: int = BATCH_SIZE) -> int:
+    """Load a CSV dump with several workers on disjoint parts of the file
+
+    ``connect`` must be picklable when more than one worker is used,
+    since each worker process opens its own connection.
+    """
+    columns = read_header(path)
+    ranges = file_ranges(path, workers)
+    if workers <= 1:
+        return sum(load_range(connect, path, start, end, columns, batch_size)
+                   for start, end in ranges)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(load_range, connect, path, start, end,
+                                   columns, batch_size)
+                   for start, end in ranges]
+        return sum(future.result() for future in futures)
+
+
+def create_sqlite_table(db_path: str, columns: Sequence[str]) -> None:
+    """Create the users table in a local sqlite3 stand-in database"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS users ({})".format(
+            ", ".join(f"{column} TEXT" for column in columns)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main(argv: List[str] = None) -> None:
+    """Parse the command line and load the requested CSV dump"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("csv_file", help="CSV dump with a header line")
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="load into a sqlite3 database instead of MySQL")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("-b", "--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.sqlite is None:
+        connect = get_db
+    else:
+        create_sqlite_table(args.sqlite, read_header(args.csv_file))
+        connect = functools.partial(sqlite3.connect, args.sqlite,
+                                    timeout=60)
+    start = time.perf_counter()
+    count = bulk_load(connect, args.csv_file, args.workers, args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"loaded {count} rows in {elapsed:.2f}s "
+          f"({count / elapsed if elapsed else 0.0:.0f} rows/sec)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Pool of reusable DB-API 2.0 connections
+"""
+
+import contextlib
+import queue
+import threading
+from typing import Any, Callable, Iterator, Optional
+
+
+def ping(conn: Any) -> bool:
+    """Check that a connection still answers a trivial query"""
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+class ConnectionPool:
+    """Thread-safe pool of connections opened lazily up to a fixed size
+
+    Connections come from the ``connect`` factory, so any DB-API driver
+    works (mysql.connector in production, sqlite3 offline). Idle
+    connections are health checked with ``check`` when they are checked
+    out and replaced when the check fails.
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int = 5,
+                 check: Optional[Callable[[Any], bool]] = ping):
+        """Initialize ConnectionPool"""
+        if size < 1:
+            raise ValueError("pool size must be at least 1")
+        self.size = size
+        self._connect = connect
+        self._check = check
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def acquire(self, timeout: float = None) -> Any:
+        """Check out a healthy connection, opening one if none is idle"""
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("no connection available in the pool")
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._check is None or self._check(conn):
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        """Return a connection to the pool, or close it if discarded
+
+        A kept connection is rolled back first, so the next borrower does
+        not inherit an open transaction, its snapshot or its uncommitted
+        writes; a connection that fails to roll back is discarded.
+        """
+        try:
+            if not discard and not self._closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+            if discard or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextlib.contextmanager
+    def connection(self, timeout: float = None) -> Iterator[Any]:
+        """Borrow a connection for the duration of a with block
+
+        Whatever the block did not commit is rolled back on the way back
+        to the pool, and an exception raised by the block propagates.
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close every idle connection and refuse further checkouts"""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    @staticmethod
+    def _discard(conn: Any) -> None:
+        """Close a connection, ignoring errors from a dead one"""
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -2,9 +2,95 @@
 """
  Hashes a password using the bcrypt algorithm.
  Check if a given password matches a hashed password.
+ Hash or check many passwords at once on a thread or process pool.
+ Calibrate the bcrypt cost to a per-hash latency budget.
+ Hash and check passwords from asyncio code without blocking the loop.
 """
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
 import bcrypt
 
+MIN_ROUNDS = 12
+MAX_ROUNDS = 16
+PROBE_ROUNDS = 6
+HASH_BUDGET_MS = 250
+
+_rounds = None
+_rounds_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def calibrate_rounds(budget_ms: float = None) -> int:
+    """
+    Pick the highest bcrypt cost whose hash fits a latency budget.
+
+    Each extra round doubles the work, so a few cheap probe hashes are
+    enough to extrapolate the time of every higher cost.
+
+    Args:
+        budget_ms (float): The per-hash budget in milliseconds, read from
+        BCRYPT_HASH_BUDGET_MS by default.
+
+    Returns:
+        int: The cost, between MIN_ROUNDS and MAX_ROUNDS.
+    """
+    if budget_ms is None:
+        budget_ms = float(os.environ.get("BCRYPT_HASH_BUDGET_MS",
+                                         HASH_BUDGET_MS))
+    salt = bcrypt.gensalt(PROBE_ROUNDS)
+    probe = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        probe = min(probe, time.perf_counter() - start)
+    rounds = PROBE_ROUNDS
+    while rounds < MAX_ROUNDS and \
+            probe * 2 ** (rounds + 1 - PROBE_ROUNDS) * 1000 <= budget_ms:
+        rounds += 1
+    return max(MIN_ROUNDS, rounds)
+
+
+def get_rounds() -> int:
+    """
+    Return the bcrypt cost for new hashes, calibrating it on first use.
+
+    Returns:
+        int: The calibrated cost.
+    """
+    global _rounds
+    if _rounds is None:
+        with _rounds_lock:
+            if _rounds is None:
+                _rounds = calibrate_rounds()
+    return _rounds
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Check if a hashed password uses a lower cost than new hashes.
+
+    A slower machine may calibrate a lower cost than the stored one;
+    such hashes are kept, so a password is never weakened by a rehash.
+
+    Args:
+        hashed_password (bytes): The stored hashed password.
+
+    Returns:
+        bool: True if the password should be hashed again once it has
+        been checked.
+    """
+    try:
+        return int(hashed_password.split(b"$")[2]) < get_rounds()
+    except (IndexError, ValueError):
+        return True
+
 
 def hash_password(password: str) -> bytes:
     """
@@ -17,7 +103,7 @@ def hash_password(password: str) -> bytes:
         bytes: The hashed password as bytes.
 
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(get_rounds())
     return bcrypt.hashpw(password.encode("utf-8"), salt)
 
 
@@ -34,3 +120,263 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         False otherwise.
     """
     return bcrypt.checkpw(password.encode("utf-8"), hashed_password)
+
+
+def _check_pair(pair: Tuple[bytes, str]) -> bool:
+    """
+    Check one (hashed_password, password) pair.
+
+    Args:
+        pair (tuple): The hashed password and the password to check.
+
+    Returns:
+        bool: True if the password matches the hashed password.
+    """
+    return is_valid(*pair)
+
+
+def _fan_out(func: Callable[[Any], Any], items: Iterable[Any],
+             workers: int = None, processes: bool = False,
+             progress: Callable[[int, float], None] = None,
+             progress_every: int = 1000) -> Iterator[Any]:
+    """
+    Run a function over items on a pool and yield the results in order.
+
+    At most four items per worker are in flight, so items can be streamed
+    from a generator of any length.
+
+    Args:
+        func (callable): The function to apply to each item.
+        items (iterable): The items to process.
+        workers (int): The pool size, the CPU count by default.
+        processes (bool): Use a process pool instead of a thread pool.
+        progress (callable): Called with the number of results and the
+        elapsed seconds every progress_every results and at the end.
+        progress_every (int): How often progress is reported.
+
+    Returns:
+        Iterator: The results, in the order of the items.
+    """
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    start = time.perf_counter()
+    done = 0
+    with pool(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) < workers * 4:
+                continue
+            yield pending.popleft().result()
+            done += 1
+            if progress is not None and done % progress_every == 0:
+                progress(done, time.perf_counter() - start)
+        while pending:
+            yield pending.popleft().result()
+            done += 1
+            if progress is not None and done % progress_every == 0:
+                progress(done, time.perf_counter() - start)
+    if progress is not None and done % progress_every != 0:
+        progress(done, time.perf_counter() - start)
+
+
+def hash_passwords(passwords: Iterable[str], workers: int = None,
+                   processes: bool = False,
+                   progress: Callable[[int, float], None] = None,
+                   progress_every: int = 1000) -> Iterator[bytes]:
+    """
+    Hashes many passwords in parallel.
+
+    bcrypt releases the GIL while hashing, so a thread pool already uses
+    every core; processes are available for interpreters where it does
+    not.
+
+    Args:
+        passwords (iterable): The passwords to be hashed.
+        workers (int): The pool size, the CPU count by default.
+        processes (bool): Use a process pool instead of a thread pool.
+        progress (callable): Called with the number of hashed passwords
+        and the elapsed seconds, from which throughput follows.
+        progress_every (int): How often progress is reported.
+
+    Returns:
+        Iterator[bytes]: The hashed passwords, in input order.
+    """
+    return _fan_out(hash_password, passwords, workers, processes,
+                    progress, progress_every)
+
+
+def check_passwords(pairs: Iterable[Tuple[bytes, str]], workers: int = None,
+                    processes: bool = False,
+                    progress: Callable[[int, float], None] = None,
+                    progress_every: int = 1000) -> Iterator[bool]:
+    """
+    Check many (hashed_password, password) pairs in parallel.
+
+    Args:
+        pairs (iterable): The hashed passwords and passwords to check.
+        workers (int): The pool size, the CPU count by default.
+        processes (bool): Use a process pool instead of a thread pool.
+        progress (callable): Called with the number of checked pairs
+        and the elapsed seconds, from which throughput follows.
+        progress_every (int): How often progress is reported.
+
+    Returns:
+        Iterator[bool]: Whether each password matches, in input order.
+    """
+    return _fan_out(_check_pair, pairs, workers, processes,
+                    progress, progress_every)
+
+
+class HashMetrics:
+    """
+    Queue-wait and execution-time totals of the async bcrypt wrappers.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty totals.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clear every total.
+        """
+        with self._lock:
+            self.count = 0
+            self.queue_wait_total = 0.0
+            self.queue_wait_max = 0.0
+            self.execution_total = 0.0
+            self.execution_max = 0.0
+
+    def record(self, queue_wait: float, execution: float) -> None:
+        """
+        Add the timings of one bcrypt call.
+
+        Args:
+            queue_wait (float): Seconds spent waiting for a worker.
+            execution (float): Seconds spent hashing.
+        """
+        with self._lock:
+            self.count += 1
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.execution_total += execution
+            self.execution_max = max(self.execution_max, execution)
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the call count and the mean and max timings in seconds.
+
+        Returns:
+            dict: The current totals.
+        """
+        with self._lock:
+            count = self.count or 1
+            return {
+                "count": self.count,
+                "queue_wait_mean": self.queue_wait_total / count,
+                "queue_wait_max": self.queue_wait_max,
+                "execution_mean": self.execution_total / count,
+                "execution_max": self.execution_max,
+            }
+
+
+metrics = HashMetrics()
+
+
+def set_async_concurrency(workers: int) -> None:
+    """
+    Set how many bcrypt calls the async wrappers run at once.
+
+    Calls already submitted finish on the previous executor.
+
+    Args:
+        workers (int): The size of the dedicated executor.
+    """
+    global _executor
+    with _executor_lock:
+        previous = _executor
+        _executor = ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix="bcrypt")
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Return the dedicated bcrypt executor, creating it on first use.
+
+    Its size comes from BCRYPT_ASYNC_CONCURRENCY, the CPU count by
+    default.
+
+    Returns:
+        ThreadPoolExecutor: The executor.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(os.environ.get("BCRYPT_ASYNC_CONCURRENCY",
+                                             os.cpu_count() or 1))
+                _executor = ThreadPoolExecutor(max_workers=workers,
+                                               thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def _run_bcrypt(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a bcrypt call on the dedicated executor and record its timings.
+
+    Args:
+        func (callable): The blocking function to run.
+        *args: Its arguments.
+
+    Returns:
+        Any: What the function returned.
+    """
+    submitted = time.perf_counter()
+
+    def timed() -> Any:
+        """
+        Run the call, timing the wait before it and the call itself.
+        """
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            metrics.record(started - submitted,
+                           time.perf_counter() - started)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), timed)
+
+
+async def async_hash_password(password: str) -> bytes:
+    """
+    Hashes a password without blocking the event loop.
+
+    Args:
+        password (str): The password to be hashed.
+
+    Returns:
+        bytes: The hashed password as bytes.
+    """
+    return await _run_bcrypt(hash_password, password)
+
+
+async def async_is_valid(hashed_password: bytes, password: str) -> bool:
+    """
+    Check a password against a hash without blocking the event loop.
+
+    Args:
+        hashed_password (bytes): The hashed password to compare against.
+        password (str): The password to check.
+
+    Returns:
+        bool: True if the password matches the hashed password,
+        False otherwise.
+    """
+    return await _run_bcrypt(is_valid, hashed_password, password)
@@ -3,72 +3,629 @@
 Personal data
 """
 
+import atexit
+import copy
+import functools
 import logging
 import os
+import queue
+import random
 import re
-from typing import List
+import resource
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import (Callable, Dict, Hashable, Iterable, List, Mapping,
+                    NamedTuple, Optional, Pattern, Sequence, Tuple, Union)
 import mysql.connector
 from mysql.connector import MySQLConnection, Error
+from db_pool import ConnectionPool
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+USER_COLUMNS = ("name", "email", "phone", "ssn", "ip", "last_login",
+                "user_agent")
+EXPORT_BATCH_SIZE = 1000
+LOG_QUEUE_SIZE = 10000
+PLACEHOLDER = re.compile(r"%(?:%|[#0 +-]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa])")
+NAMED_PLACEHOLDER = re.compile(r"%\(([^)]*)\)")
+DB_POOL_SIZE = 5
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+_patterns = {}
+
+
+def _field_trie(fields: Sequence[str]) -> str:
+    """Build a regex matching any field, shaped as a trie of the names
+
+    Names sharing a prefix share one branch, so the regex engine picks
+    the next branch by character instead of trying every field in turn
+    and the cost of a scan no longer grows with the number of fields.
+    Longer names are tried before their prefixes, like the longest-first
+    alternation this replaces.
+    """
+    trie = {}
+    for field in fields:
+        node = trie
+        for char in field:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        """Render one trie node and its children as a regex"""
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if "" in node else group
+
+    return build(trie)
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_fields(fields: Sequence[str], separator: str) -> Pattern[str]:
+    """Compile every field and the separator into one cached pattern"""
+    return re.compile(
+        rf"((?:{_field_trie(fields)})=).*?({re.escape(separator)})")
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_field_names(fields: Sequence[str]) -> Pattern[str]:
+    """Compile a pattern finding where any field starts a key=value pair"""
+    return re.compile(rf"(?:{_field_trie(fields)})=")
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_fields_bytes(fields: Sequence[str],
+                          separator: str) -> Pattern[bytes]:
+    """Compile the single-pass pattern for bytes-like buffers"""
+    return re.compile(_compile_fields(fields, separator).pattern.encode())
+
+
+def _cached_pattern(compile_fields: Callable[[Sequence[str], str], Pattern],
+                    fields: Sequence[str], separator: str) -> Pattern:
+    """Return the compiled pattern of some fields without hashing them
+
+    Tuples are looked up by identity, so passing the same tuple again
+    costs O(1) whatever its length. Mutable sequences could change
+    between calls, so they are copied and go through the compile cache.
+    """
+    key = (compile_fields, id(fields), separator)
+    entry = _patterns.get(key)
+    if entry is not None and entry[0] is fields:
+        return entry[1]
+    pattern = compile_fields(tuple(fields), separator)
+    if type(fields) is tuple:
+        if len(_patterns) >= 128:
+            _patterns.clear()
+        _patterns[key] = (fields, pattern)
+    return pattern
+
+
+def _redaction_template(redaction: str) -> str:
+    """Build the substitution template keeping field name and separator"""
+    return r"\g<1>" + redaction.replace("\\", r"\\") + r"\g<2>"
+
+
+class Redactor:
+    """Redact a fixed set of fields from messages, compiled once
+
+    Equivalent to ``filter_datum`` with the same arguments, for callers
+    redacting many messages with a field list they know in advance.
+    """
+
+    __slots__ = ("fields", "redaction", "separator", "_pattern",
+                 "_template")
+
+    def __init__(self, fields: Sequence[str], redaction: str,
+                 separator: str):
+        """Initialize Redactor"""
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self._pattern = _compile_fields(self.fields, separator) \
+            if self.fields else None
+        self._template = _redaction_template(redaction)
+
+    def __call__(self, message: str) -> str:
+        """Replace the fields of a message with redacted values"""
+        if self._pattern is None:
+            return message
+        return self._pattern.sub(self._template, message)
 
 
 def filter_datum(fields: List[str], redaction: str, message: str,
                  separator: str) -> str:
-    """Replace fields with redacted values"""
-    for field in fields:
-        message = re.sub(rf"{field}=(.*?){separator}",
-                         f'{field}={redaction}{separator}', message)
-    return message
+    """Replace fields with redacted values
+
+    Pass the fields as a tuple, or use a Redactor, to skip copying them
+    on every call.
+    """
+    if not fields:
+        return message
+    return _cached_pattern(_compile_fields, fields, separator).sub(
+        _redaction_template(redaction), message)
+
+
+def filter_datum_bytes(fields: List[str], redaction: Union[str, bytes],
+                       buffer: Union[bytes, bytearray, memoryview],
+                       separator: str,
+                       out: Union[bytearray, memoryview] = None) -> int:
+    """Replace fields with redacted values in a bytes-like buffer
+
+    Without ``out``, the redacted text is compacted in place at the start
+    of ``buffer``, which must be writable and hold no value shorter than
+    the redaction; the bytes left over after it are zeroed, so no part of
+    a redacted value survives in the buffer. Otherwise it is written to
+    the start of ``out``. Returns the length of the redacted text.
+    """
+    if isinstance(redaction, str):
+        redaction = redaction.encode()
+    data = memoryview(buffer).cast("B")
+    spans = []
+    if fields:
+        pattern = _cached_pattern(_compile_fields_bytes, fields, separator)
+        spans = [(match.end(1), match.start(2))
+                 for match in pattern.finditer(data)]
+    if out is None:
+        if data.readonly:
+            raise ValueError("read-only buffer needs an output buffer")
+        if any(end - start < len(redaction) for start, end in spans):
+            raise ValueError("redaction longer than a value needs an "
+                             "output buffer")
+        target = data
+    else:
+        target = memoryview(out).cast("B")
+        size = len(data) + sum(len(redaction) - end + start
+                               for start, end in spans)
+        if target.readonly or len(target) < size:
+            raise ValueError("output buffer is read-only or too small")
+
+    write = read = 0
+    for start, end in spans:
+        size = start - read
+        target[write:write + size] = data[read:start]
+        write += size
+        target[write:write + len(redaction)] = redaction
+        write += len(redaction)
+        read = end
+    size = len(data) - read
+    target[write:write + size] = data[read:]
+    write += size
+    if out is None:
+        target[write:] = bytes(len(target) - write)
+    return write
+
+
+class _TemplatePlan(NamedTuple):
+    """Redacted form of a message template and the arguments it keeps"""
+    template: str
+    kept: Tuple[int, ...]
+    nargs: int
+    equals: int
 
 
 class RedactingFormatter(logging.Formatter):
-    """RedactingFormatter class."""
+    """RedactingFormatter class.
+
+    Records whose values are passed as a mapping, either as the logging
+    arguments (``logger.info("name=%(name)s;", {"name": ...})``) or as
+    ``extra={"fields": {...}}``, are redacted by key before rendering.
+    They skip the regex scan only when nothing else can hold PII: every
+    field in the message text is followed by the placeholder of its own
+    key, every placeholder sits right after its own key, and the values
+    kept are plain scalars holding neither ``=`` nor the separator.
+
+    Records with positional arguments are redacted through their message
+    template: the PII positions of each ``record.msg`` are found once and
+    kept in an LRU cache, then the PII arguments are dropped and the
+    template is rendered already redacted. Every other record, and any
+    record whose arguments could add fields of their own, falls back to
+    regex redaction of the formatted line.
+    """
 
     REDACTION = "***"
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
+    STRUCTURED_ATTR = "fields"
+    TEMPLATE_CACHE_SIZE = 256
 
     def __init__(self, fields: List[str]):
         """Initialize RedactingFormatter"""
         self.fields = fields
+        self._field_set = frozenset(fields)
+        self._pattern = _compile_fields(tuple(fields), self.SEPARATOR) \
+            if fields else None
+        self._template = _redaction_template(self.REDACTION)
+        self._plan_template = functools.lru_cache(
+            maxsize=self.TEMPLATE_CACHE_SIZE)(self._plan_template)
+        self._keyed_template = functools.lru_cache(
+            maxsize=self.TEMPLATE_CACHE_SIZE)(self._keyed_template)
         super().__init__(self.FORMAT)
 
+    def template_cache_info(self):
+        """Return the hits, misses and size of the template cache"""
+        return self._plan_template.cache_info()
+
     def format(self, record: logging.LogRecord) -> str:
         """Format log record"""
-        return filter_datum(self.fields, self.REDACTION,
-                            super().format(record), self.SEPARATOR)
+        if isinstance(record.args, Mapping):
+            return self._format_structured(record, record.args)
+        data = getattr(record, self.STRUCTURED_ATTR, None)
+        if isinstance(data, Mapping) and not record.args:
+            return self._format_structured(record, data)
+        if self._pattern is not None and record.args and \
+                isinstance(record.args, tuple) and \
+                isinstance(record.msg, str) and \
+                not record.exc_info and not record.stack_info:
+            message = self._format_template(record)
+            if message is not None:
+                return message
+        message = super().format(record)
+        if self._pattern is None:
+            return message
+        return self._pattern.sub(self._template, message)
+
+    def _keyed_template(self, msg: str, named: bool) -> bool:
+        """Tell whether a message text only holds PII through its keys
+
+        Every field of the text must be followed by the placeholder of
+        the same key, and with ``named`` placeholders every placeholder
+        must follow its own key; without it the text may hold none.
+        """
+        if not isinstance(msg, str):
+            return False
+        for match in _compile_field_names(tuple(self.fields)).finditer(msg):
+            key = match.group()[:-1]
+            if not named or \
+                    not msg.startswith(f"%({key})", match.end()):
+                return False
+        for match in NAMED_PLACEHOLDER.finditer(msg):
+            key = match.group(1)
+            if not named or not msg.endswith(f"{key}=", 0, match.start()):
+                return False
+        return True
+
+    def _safe_value(self, value) -> bool:
+        """Tell whether a kept value can not start or end a pair"""
+        if value is None or isinstance(value, (bool, int, float)):
+            return True
+        return isinstance(value, str) and "=" not in value and \
+            self.SEPARATOR not in value
+
+    def _format_structured(self, record: logging.LogRecord,
+                           data: Mapping) -> str:
+        """Redact a mapping of values by key, then render the record
+
+        The regex scan still runs on the rendered line unless the
+        message text and the kept values are known not to hold PII and
+        the record carries no traceback or stack.
+        """
+        redacted = {key: self.REDACTION if key in self._field_set else value
+                    for key, value in data.items()}
+        traced = record.exc_info or record.exc_text or record.stack_info
+        safe = not traced and all(
+            self._safe_value(value) for key, value in redacted.items()
+            if key not in self._field_set)
+        record = copy.copy(record)
+        if record.args is data:
+            if safe:
+                try:
+                    safe = self._keyed_template(record.msg, True)
+                except TypeError:
+                    safe = False
+            record.args = redacted
+        else:
+            if safe:
+                safe = all(self._safe_value(key) for key in redacted)
+            if safe:
+                try:
+                    safe = self._keyed_template(record.msg, False)
+                except TypeError:
+                    safe = False
+            pairs = "".join(f"{key}={value}{self.SEPARATOR}"
+                            for key, value in redacted.items())
+            record.msg = f"{record.msg} {pairs}" if record.msg else pairs
+        message = super().format(record)
+        if safe or self._pattern is None:
+            return message
+        return self._pattern.sub(self._template, message)
+
+    def _plan_template(self, msg: str) -> Optional[_TemplatePlan]:
+        """Find where PII fields sit in a message template
+
+        The placeholders are replaced by NUL markers and the field
+        pattern is run over the result. Every field value is replaced by
+        the redaction and the arguments inside it are dropped. Returns
+        None when arguments could take part in a field name, or when a
+        field value has no separator in the template itself.
+        """
+        text = []
+        offsets = []
+        markers = []
+        position = 0
+        for match in PLACEHOLDER.finditer(msg):
+            literal = msg[position:match.start()]
+            if "%" in literal or "\0" in literal:
+                return None
+            text.append(literal)
+            offsets.extend(range(position, match.start()))
+            if match.group() == "%%":
+                text.append("%")
+            else:
+                markers.append(len(offsets))
+                text.append("\0")
+            offsets.append(match.start())
+            position = match.end()
+        literal = msg[position:]
+        if "%" in literal or "\0" in literal:
+            return None
+        text.append(literal)
+        offsets.extend(range(position, len(msg) + 1))
+        text = "".join(text)
+
+        for equals in re.finditer("=", text):
+            marker = text.rfind("\0", 0, equals.start())
+            if marker == -1:
+                continue
+            tail = text[marker + 1:equals.start()]
+            if any(len(field) > len(tail) and field.endswith(tail)
+                   for field in self.fields):
+                return None
+        matches = list(self._pattern.finditer(text))
+        if len(matches) != len(list(self._pattern.finditer(
+                text + self.SEPARATOR))):
+            return None
+
+        redaction = self.REDACTION.replace("%", "%%")
+        pieces = []
+        dropped = set()
+        position = 0
+        for match in matches:
+            start, end = match.end(1), match.start(2)
+            pieces.append(msg[offsets[position]:offsets[start]])
+            pieces.append(redaction)
+            dropped.update(index for index, marker in enumerate(markers)
+                           if start <= marker < end)
+            position = end
+        pieces.append(msg[offsets[position]:])
+        template = "".join(pieces)
+        kept = tuple(index for index in range(len(markers))
+                     if index not in dropped)
+        return _TemplatePlan(template, kept, len(markers),
+                             template.count("="))
+
+    def _format_template(self, record: logging.LogRecord) -> Optional[str]:
+        """Render a record through its cached, pre-redacted template
+
+        The template was redacted assuming every value ends at the next
+        separator of the text, so records with an argument holding the
+        separator, or one that is not a plain string or number, go
+        through the regex scan instead.
+        """
+        try:
+            plan = self._plan_template(record.msg)
+        except TypeError:
+            return None
+        if plan is None or len(record.args) != plan.nargs:
+            return None
+        for arg in record.args:
+            if isinstance(arg, str):
+                if self.SEPARATOR in arg:
+                    return None
+            elif not isinstance(arg, (int, float)):
+                return None
+        try:
+            message = plan.template % tuple(record.args[i]
+                                            for i in plan.kept)
+        except (TypeError, ValueError):
+            return None
+        if message.count("=") != plan.equals:
+            return None
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        return super().format(record)
+
+    def format_batch(self, records: Iterable[logging.LogRecord]) -> str:
+        """Format several log records and redact them in a single pass"""
+        lines = []
+        for record in records:
+            lines.append(super().format(record))
+        block = "\n".join(lines)
+        if self._pattern is None:
+            return block
+        return self._pattern.sub(self._template, block)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler that drops or blocks when its queue is full"""
+
+    def __init__(self, log_queue: queue.Queue, block: bool = False,
+                 timeout: float = None):
+        """Initialize BoundedQueueHandler"""
+        super().__init__(log_queue)
+        self.block = block
+        self.timeout = timeout
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge the message arguments, leaving formatting to the listener
+
+        Mapping arguments are kept, copied, so the listener can still
+        redact them by key, and so are positional arguments that are all
+        immutable scalars, so it can still redact through the template.
+        """
+        record = copy.copy(record)
+        if isinstance(record.args, Mapping):
+            record.args = dict(record.args)
+        elif isinstance(record.args, tuple) and all(
+                isinstance(arg, (str, int, float, type(None)))
+                for arg in record.args):
+            pass
+        else:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Put a record on the queue according to the full-queue policy"""
+        try:
+            self.queue.put(record, self.block, self.timeout)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class FlushingQueueListener(QueueListener):
+    """QueueListener that drains a full queue before stopping"""
+
+    def enqueue_sentinel(self) -> None:
+        """Wait for room on the queue instead of failing when it is full"""
+        self.queue.put(self._sentinel)
+
+    def stop(self) -> None:
+        """Stop the listener, doing nothing if it is already stopped
+
+        get_logger registers this at exit, so a listener the caller
+        stopped itself must not fail the second time.
+        """
+        if self._thread is not None:
+            super().stop()
+
+
+class SamplingFilter(logging.Filter):
+    """Logger filter that samples and rate limits records
+
+    ``level_rates`` and ``template_rates`` give the share of records to
+    keep per level number and per ``record.msg`` template, a template
+    rate taking precedence. ``rate`` records per second, with bursts of
+    up to ``burst`` (at least 1, by default ``rate`` or 1 if it is less),
+    pass a token bucket shared by all records; leave it None to disable
+    rate limiting. Added to a logger, the filter runs
+    before any handler, so dropped records are never redacted.
+    """
+
+    def __init__(self, level_rates: Mapping[int, float] = None,
+                 template_rates: Mapping[Hashable, float] = None,
+                 rate: float = None, burst: float = None,
+                 sample: Callable[[], float] = random.random):
+        """Initialize SamplingFilter"""
+        super().__init__()
+        self.level_rates = dict(level_rates or {})
+        self.template_rates = dict(template_rates or {})
+        if burst is None and rate is not None:
+            burst = max(1.0, rate)
+        if burst is not None and burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._sample = sample
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.emitted = 0
+        self.sampled_out = 0
+        self.rate_limited = 0
+
+    def _rate_for(self, record: logging.LogRecord) -> float:
+        """Return the share of records like this one to keep"""
+        try:
+            rate = self.template_rates.get(record.msg)
+        except TypeError:
+            rate = None
+        if rate is None:
+            rate = self.level_rates.get(record.levelno, 1.0)
+        return rate
+
+    def _take_token(self) -> bool:
+        """Take one token from the bucket, refilling it first"""
+        now = time.monotonic()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Decide whether a record is emitted"""
+        rate = self._rate_for(record)
+        keep = rate >= 1.0 or self._sample() < rate
+        with self._lock:
+            if not keep:
+                self.sampled_out += 1
+                return False
+            if self.rate is not None and not self._take_token():
+                self.rate_limited += 1
+                return False
+            self.emitted += 1
+        return True
+
+    def counters(self) -> Dict[str, int]:
+        """Return the emitted and dropped record counts"""
+        with self._lock:
+            return {"emitted": self.emitted,
+                    "sampled_out": self.sampled_out,
+                    "rate_limited": self.rate_limited}
 
 
-def get_logger() -> logging.Logger:
-    """Implement a logger"""
+def get_logger(async_mode: bool = False, queue_size: int = LOG_QUEUE_SIZE,
+               block: bool = False,
+               sampler: SamplingFilter = None) -> logging.Logger:
+    """Implement a logger
+
+    With async_mode, redaction and stream writes run on a background
+    listener thread fed by a bounded queue; records are dropped when the
+    queue is full unless block is set. The queue is flushed at exit.
+    A sampler is added as a logger filter, ahead of every handler.
+    """
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
     logger.propagate = False
+    if sampler is not None:
+        logger.addFilter(sampler)
     handler = logging.StreamHandler()
     handler.setFormatter(RedactingFormatter(PII_FIELDS))
+    if async_mode:
+        log_queue = queue.Queue(maxsize=queue_size)
+        listener = FlushingQueueListener(log_queue, handler,
+                                         respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        handler = BoundedQueueHandler(log_queue, block=block)
+        handler.listener = listener
     logger.addHandler(handler)
     return logger
 
 
-def get_db() -> MySQLConnection:
-    """Implement db connectivity"""
+def _db_config() -> Dict[str, str]:
+    """Read the database credentials from the environment"""
     try:
-        psw = os.environ["PERSONAL_DATA_DB_PASSWORD"]
-        username = os.environ['PERSONAL_DATA_DB_USERNAME']
-        host = os.environ['PERSONAL_DATA_DB_HOST']
-        db_name = os.environ['PERSONAL_DATA_DB_NAME']
+        return {
+            "password": os.environ["PERSONAL_DATA_DB_PASSWORD"],
+            "user": os.environ['PERSONAL_DATA_DB_USERNAME'],
+            "host": os.environ['PERSONAL_DATA_DB_HOST'],
+            "database": os.environ['PERSONAL_DATA_DB_NAME'],
+        }
     except KeyError:
         # logger = get_logger()
         # logger.error("Missing required environment variable: %s", e)
         return None
+
+
+def get_db() -> MySQLConnection:
+    """Implement db connectivity"""
+    config = _db_config()
+    if config is None:
+        return None
     try:
-        conn = mysql.connector.connect(
-            host=host,
-            database=db_name,
-            user=username,
-            password=psw
-        )
+        conn = mysql.connector.connect(**config)
         return conn
     except Error:
         # logger = get_logger()
@@ -76,26 +633,98 @@ def get_db() -> MySQLConnection:
         return None
 
 
+def get_db_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use
+
+    The credentials are read once, and the pool size comes from
+    PERSONAL_DATA_DB_POOL_SIZE. Returns None when credentials are missing.
+    """
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            config = _db_config()
+            if config is None:
+                return None
+            size = int(os.environ.get("PERSONAL_DATA_DB_POOL_SIZE",
+                                      DB_POOL_SIZE))
+            _db_pool = ConnectionPool(
+                functools.partial(mysql.connector.connect, **config), size)
+            atexit.register(_db_pool.close)
+        return _db_pool
+
+
+def _emit_batch(logger: logging.Logger,
+                records: List[logging.LogRecord]) -> None:
+    """Write a batch of records with one write per handler"""
+    for handler in logger.handlers:
+        formatter = handler.formatter
+        if not isinstance(handler, logging.StreamHandler) or \
+                not isinstance(formatter, RedactingFormatter):
+            for record in records:
+                handler.handle(record)
+            continue
+        block = formatter.format_batch(records)
+        handler.acquire()
+        try:
+            handler.stream.write(block + handler.terminator)
+            handler.flush()
+        finally:
+            handler.release()
+
+
+def export_users(db, logger: logging.Logger,
+                 batch_size: int = EXPORT_BATCH_SIZE) -> int:
+    """Stream the users table to the logger in redacted batches"""
+    if not logger.isEnabledFor(logging.INFO):
+        return 0
+    start = time.perf_counter()
+    count = 0
+    # mysql.connector cursors are unbuffered by default, so rows are
+    # pulled from the server one batch at a time instead of all at once
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users;")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            records = []
+            for row in rows:
+                message = (f"name={row[0]}; email={row[1]}; phone={row[2]}; "
+                           f"ssn={row[3]}; password=REDACTED; ip={row[4]}; "
+                           f"last_login={row[5]}; user_agent={row[6]};")
+                record = logger.makeRecord(logger.name, logging.INFO,
+                                           __file__, 0, message, None, None)
+                if logger.filter(record):
+                    records.append(record)
+            if records:
+                _emit_batch(logger, records)
+            count += len(rows)
+    finally:
+        cursor.close()
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    logger.info("exported %d rows in %.2fs (%.0f rows/sec, peak RSS %d KiB)",
+                count, elapsed, count / elapsed if elapsed else 0.0, peak)
+    return count
+
+
 def main() -> None:
     """Implement the main function"""
     logger = get_logger()
-    db = get_db()
-    if db is None:
+    pool = get_db_pool()
+    if pool is None:
         # logger.error("Failed to connect to database")
         return
 
-    with db.cursor() as cursor:
-        try:
-            cursor.execute("SELECT * FROM users;")
-            for row in cursor:
-                message = (f"name={row[0]}; email={row[1]}; phone={row[2]}; "
-                           f"ssn={row[3]}; password=REDACTED; ip={row[5]}; "
-                           f"last_login={row[6]}; user_agent={row[7]};")
-                logger.info(message)
-        except Error:
-            # logger.error("Error executing query: %s", err)
-            pass
-    db.close()
+    batch_size = int(os.environ.get("PERSONAL_DATA_EXPORT_BATCH_SIZE",
+                                    EXPORT_BATCH_SIZE))
+    try:
+        with pool.connection() as db:
+            export_users(db, logger, batch_size)
+    except Error:
+        # logger.error("Error executing query: %s", err)
+        pass
 
 
 if __name__ == '__main__':
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Tests of the redaction done by filtered_logger"""
+import logging
+import sys
+import unittest
+
+from filtered_logger import RedactingFormatter, filter_datum_bytes
+
+
+class TestStructuredRedaction(unittest.TestCase):
+    """Records whose values are passed as a mapping"""
+
+    def setUp(self):
+        """Use a formatter that only prints the message"""
+        self.formatter = RedactingFormatter(fields=("email", "name", "ssn"))
+        self.formatter._style._fmt = self.formatter._fmt = "%(message)s"
+
+    def format(self, msg, args=None, fields=None):
+        """Format one record through the redacting formatter"""
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, msg,
+                                   (args,) if args is not None else None,
+                                   None)
+        if fields is not None:
+            record.fields = fields
+        return self.formatter.format(record)
+
+    def test_keyed_placeholders(self):
+        """Values placed under their own key are redacted by key"""
+        self.assertEqual(self.format("name=%(name)s; id=%(id)s;",
+                                     {"name": "bob", "id": 7}),
+                         "name=***; id=7;")
+
+    def test_literal_field_in_message(self):
+        """A field written in the message text itself is redacted"""
+        self.assertEqual(self.format("email=bob@x.com; id=%(id)s;",
+                                     {"id": 7}),
+                         "email=***; id=7;")
+
+    def test_placeholder_under_another_field(self):
+        """A value placed under a field other than its key is redacted"""
+        self.assertEqual(self.format("name=%(a)s;", {"a": "bob"}),
+                         "name=***;")
+
+    def test_value_holding_a_field(self):
+        """A value that itself holds a field is redacted"""
+        self.assertNotIn("bob", self.format("user=%(u)s;",
+                                            {"u": "name=bob;"}))
+
+    def test_extra_fields(self):
+        """Extra fields and the message text are both redacted"""
+        message = self.format("email=bob@x.com; hi",
+                              fields={"name": "bob", "id": 7})
+        self.assertEqual(message, "email=***; hi name=***;id=7;")
+
+    def test_traceback_holding_a_field(self):
+        """A field in the traceback is redacted on both mapping paths"""
+        try:
+            raise ValueError("email=bob@x.com;")
+        except ValueError:
+            record = logging.LogRecord("test", logging.ERROR, __file__, 1,
+                                       "failed id=%(id)s;", ({"id": 7},),
+                                       sys.exc_info())
+            message = self.formatter.format(record)
+            record = logging.LogRecord("test", logging.ERROR, __file__, 1,
+                                       "failed", None, sys.exc_info())
+            record.fields = {"id": 7}
+            extra = self.formatter.format(record)
+        for text in (message, extra):
+            self.assertIn("email=***;", text)
+            self.assertNotIn("bob@x.com", text)
+
+
+class TestTemplateRedaction(unittest.TestCase):
+    """Records rendered through a pre-redacted template"""
+
+    def test_argument_holding_the_separator(self):
+        """A value holding the separator does not swallow the next pair"""
+        formatter = RedactingFormatter(fields=("name",))
+        formatter._style._fmt = formatter._fmt = "%(message)s"
+        record = logging.LogRecord("test", logging.INFO, __file__, 1,
+                                   "name=%s ip=%s;", ("bob;", "1"), None)
+        self.assertEqual(formatter.format(record), "name=***; ip=1;")
+
+
+class TestBytesRedaction(unittest.TestCase):
+    """Redaction of bytes-like buffers"""
+
+    def test_in_place_clears_the_tail(self):
+        """No byte of a redacted value is left after the redacted text"""
+        buffer = bytearray(b"ip=1;ssn=123-45-6789;")
+        size = filter_datum_bytes(["ssn"], "***", buffer, ";")
+        self.assertEqual(bytes(buffer[:size]), b"ip=1;ssn=***;")
+        self.assertEqual(bytes(buffer[size:]), bytes(len(buffer) - size))
+
+
+if __name__ == '__main__':
+    unittest.main()
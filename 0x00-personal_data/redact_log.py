@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Redact PII from existing log files using a process pool
+"""
+
+import argparse
+import mmap
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Sequence, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def chunk_offsets(data: mmap.mmap,
+                  chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, int]]:
+    """Split a mapped file into (start, end) ranges ending on a newline"""
+    size = len(data)
+    start = 0
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            newline = data.find(b"\n", end - 1)
+            end = size if newline == -1 else newline + 1
+        yield start, end
+        start = end
+
+
+def redact_chunk(path: str, start: int, end: int, fields: Sequence[str],
+                 redaction: str, separator: str) -> bytes:
+    """Redact one line-aligned byte range of a log file"""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = data[start:end].decode("utf-8", "surrogateescape")
+    return filter_datum(list(fields), redaction, text,
+                        separator).encode("utf-8", "surrogateescape")
+
+
+def redact_file(path: str, output: BinaryIO, fields: Sequence[str],
+                redaction: str, separator: str, workers: int = None,
+                chunk_size: int = CHUNK_SIZE) -> int:
+    """Redact a log file chunk by chunk and write the chunks in order
+
+    At most two chunks per worker are in flight, so memory stays bounded
+    by the chunk size whatever the size of the input file.
+    """
+    if os.path.getsize(path) == 0:
+        return 0
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            ranges = list(chunk_offsets(data, chunk_size))
+    workers = workers or os.cpu_count() or 1
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        window = workers * 2
+        pending = deque()
+        for start, end in ranges:
+            pending.append(executor.submit(redact_chunk, path, start, end,
+                                           fields, redaction, separator))
+            if len(pending) >= window:
+                written += output.write(pending.popleft().result())
+        while pending:
+            written += output.write(pending.popleft().result())
+    return written
+
+
+def main(argv: List[str] = None) -> None:
+    """Parse the command line and redact the requested log file"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("input", help="log file to redact")
+    parser.add_argument("-o", "--output",
+                        help="redacted log file (default: stdout)")
+    parser.add_argument("-f", "--fields", default=",".join(PII_FIELDS),
+                        help="comma separated fields to redact")
+    parser.add_argument("-r", "--redaction",
+                        default=RedactingFormatter.REDACTION)
+    parser.add_argument("-s", "--separator",
+                        default=RedactingFormatter.SEPARATOR)
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("-c", "--chunk-size", type=int,
+                        default=CHUNK_SIZE // (1024 * 1024),
+                        help="chunk size in MiB")
+    args = parser.parse_args(argv)
+
+    fields = tuple(field for field in args.fields.split(",") if field)
+    chunk_size = args.chunk_size * 1024 * 1024
+    if args.output is None:
+        redact_file(args.input, sys.stdout.buffer, fields, args.redaction,
+                    args.separator, args.workers, chunk_size)
+        return
+    with open(args.output, "wb") as output:
+        redact_file(args.input, output, fields, args.redaction,
+                    args.separator, args.workers, chunk_size)
+
+
+if __name__ == '__main__':
+    main()
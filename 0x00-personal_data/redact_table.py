@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Redact tabular PII exports column by column
+"""
+
+import argparse
+import csv
+import sys
+from itertools import islice
+from operator import itemgetter
+from typing import (Any, Collection, Iterable, Iterator, List, Sequence,
+                    TextIO, Tuple)
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, get_db_pool
+
+BATCH_SIZE = 10000
+
+
+def _literal(text: str) -> str:
+    """Escape text for use inside a str.format template"""
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class ColumnRedactor:
+    """Redact rows of a known column schema by masking whole PII columns
+
+    PII values are never read: a batch is transposed to columns, every PII
+    column is swapped for one shared column of redactions, and the batch
+    is transposed back before it is serialized.
+    """
+
+    def __init__(self, columns: Sequence[str],
+                 pii: Collection[str] = PII_FIELDS,
+                 redaction: str = RedactingFormatter.REDACTION,
+                 separator: str = RedactingFormatter.SEPARATOR):
+        """Initialize ColumnRedactor"""
+        self.columns = tuple(columns)
+        self.redaction = redaction
+        self.separator = separator
+        self._pii = [i for i, column in enumerate(self.columns)
+                     if column in pii]
+        kept = [i for i, column in enumerate(self.columns)
+                if column not in pii]
+        if len(kept) == 1:
+            self._kept = lambda row: (row[kept[0]],)
+        else:
+            self._kept = itemgetter(*kept) if kept else lambda row: ()
+        self._kv_template = "".join(
+            "{}={}{}".format(_literal(column),
+                             _literal(redaction) if i in self._pii else "{}",
+                             _literal(separator))
+            for i, column in enumerate(self.columns))
+
+    def redact(self, rows: Sequence[Sequence[Any]]) -> List[Tuple]:
+        """Return a batch of rows with every PII column masked"""
+        if not rows:
+            return []
+        data = list(zip(*rows))
+        masked = (self.redaction,) * len(rows)
+        for i in self._pii:
+            data[i] = masked
+        return list(zip(*data))
+
+    def write_csv(self, rows: Sequence[Sequence[Any]], out: TextIO) -> None:
+        """Write a batch of rows as redacted CSV"""
+        csv.writer(out).writerows(self.redact(rows))
+
+    def write_kv(self, rows: Sequence[Sequence[Any]], out: TextIO) -> None:
+        """Write a batch of rows as redacted key=value lines
+
+        PII columns are baked into the line template as redactions, so
+        only the other columns are read from each row.
+        """
+        template = self._kv_template
+        kept = self._kept
+        out.write("".join(template.format(*kept(row)) + "\n"
+                          for row in rows))
+
+
+def csv_batches(f: TextIO, batch_size: int = BATCH_SIZE) -> Tuple[
+        List[str], Iterator[List[List[str]]]]:
+    """Return the header of a CSV file and an iterator of row batches
+
+    Blank lines are skipped; a row whose number of values differs from
+    the header raises ValueError naming its line, since the columns of a
+    batch are masked by position.
+    """
+    reader = csv.reader(f)
+    columns = next(reader)
+
+    def rows() -> Iterator[List[str]]:
+        """Yield the non-blank rows, checking their width"""
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != len(columns):
+                raise ValueError("line {}: {} values for {} columns".format(
+                    reader.line_num, len(row), len(columns)))
+            yield row
+
+    def batches() -> Iterator[List[List[str]]]:
+        """Yield lists of at most batch_size rows"""
+        checked = rows()
+        while True:
+            batch = list(islice(checked, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    return columns, batches()
+
+
+def cursor_batches(cursor: Any, batch_size: int = BATCH_SIZE) -> Iterator[
+        List[Tuple]]:
+    """Yield row batches from an executed DB-API cursor"""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield batch
+
+
+def export(columns: Sequence[str], batches: Iterable[Sequence[Sequence]],
+           out: TextIO, fmt: str = "csv") -> int:
+    """Redact and write every batch, returning the number of rows"""
+    redactor = ColumnRedactor(columns)
+    count = 0
+    if fmt == "csv":
+        csv.writer(out).writerow(columns)
+    for batch in batches:
+        if fmt == "csv":
+            redactor.write_csv(batch, out)
+        else:
+            redactor.write_kv(batch, out)
+        count += len(batch)
+    return count
+
+
+def main(argv: List[str] = None) -> None:
+    """Parse the command line and export the requested table"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("csv_file", nargs="?",
+                        help="CSV export to redact (default: users table)")
+    parser.add_argument("-f", "--format", choices=("csv", "kv"),
+                        default="csv")
+    parser.add_argument("-b", "--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("-o", "--output",
+                        help="redacted output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output is None else \
+        open(args.output, "w", newline="")
+    try:
+        if args.csv_file is not None:
+            with open(args.csv_file, newline="") as f:
+                columns, batches = csv_batches(f, args.batch_size)
+                export(columns, batches, out, args.format)
+            return
+        pool = get_db_pool()
+        if pool is None:
+            return
+        with pool.connection() as db:
+            cursor = db.cursor()
+            try:
+                cursor.execute("SELECT * FROM users;")
+                columns = [column[0] for column in cursor.description]
+                export(columns, cursor_batches(cursor, args.batch_size),
+                       out, args.format)
+            finally:
+                cursor.close()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
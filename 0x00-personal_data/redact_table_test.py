@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Tests of the column-wise redaction of redact_table"""
+import io
+import unittest
+
+from redact_table import csv_batches, export
+
+
+class TestCsvBatches(unittest.TestCase):
+    """Reading CSV exports in batches"""
+
+    def test_blank_lines_are_skipped(self):
+        """Blank lines yield no row"""
+        columns, batches = csv_batches(io.StringIO(
+            "name,email,ip\nbob,bob@x.com,1\n\nal,al@x.com,2\n"))
+        self.assertEqual(columns, ["name", "email", "ip"])
+        self.assertEqual(list(batches), [[["bob", "bob@x.com", "1"],
+                                          ["al", "al@x.com", "2"]]])
+
+    def test_short_row(self):
+        """A row missing values raises ValueError naming its line"""
+        columns, batches = csv_batches(io.StringIO(
+            "name,email,ip\nbob,bob@x.com,1\nal,al@x.com\n"))
+        with self.assertRaisesRegex(ValueError, "line 3"):
+            list(batches)
+
+    def test_long_row(self):
+        """A row with extra values raises ValueError"""
+        columns, batches = csv_batches(io.StringIO(
+            "name,email\nbob,bob@x.com,1\n"))
+        with self.assertRaises(ValueError):
+            list(batches)
+
+
+class TestExport(unittest.TestCase):
+    """Redacting whole batches"""
+
+    def test_kv_export(self):
+        """PII columns are masked and the other columns kept"""
+        columns, batches = csv_batches(io.StringIO(
+            "name,email,ip\nbob,bob@x.com,1\n\nal,al@x.com,2\n"))
+        out = io.StringIO()
+        self.assertEqual(export(columns, batches, out, "kv"), 2)
+        self.assertEqual(out.getvalue(),
+                         "name=***;email=***;ip=1;\n"
+                         "name=***;email=***;ip=2;\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+""" Benchmark the persistence of the models in a scratch directory
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from models import base
+from models.user import User
+
+
+def make_users(count: int) -> None:
+    """ Fill DATA with users without writing them to disk
+    """
+    base.DATA["User"] = {}
+    base.INDEXES.pop("User", None)
+    for i in range(count):
+        user = User(email="user{}@hbtn.io".format(i),
+                    first_name="First{}".format(i),
+                    last_name="Last{}".format(i))
+        user.password = "pwd{}".format(i)
+        base.DATA["User"][user.id] = user
+
+
+def timed(action: Callable[[], None], repeat: int) -> float:
+    """ Return the median duration of an action in milliseconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return durations[len(durations) // 2] * 1000
+
+
+def bench_fsync(counts: List[int], repeat: int) -> List[Dict]:
+    """ Measure snapshot and journal writes under every fsync policy
+    """
+    results = []
+    journal = base.JOURNAL
+    try:
+        for count in counts:
+            make_users(count)
+            user = next(iter(base.DATA["User"].values()))
+            for policy in base.FSYNC_POLICIES:
+                base.FSYNC = policy
+                base.JOURNAL = False
+                snapshot = timed(User.save_to_file, repeat)
+                base.JOURNAL = True
+                append = timed(user.save, repeat)
+                results.append({"policy": policy, "users": count,
+                                "snapshot_ms": snapshot,
+                                "journal_append_ms": append})
+    finally:
+        base.JOURNAL = journal
+    return results
+
+
+def bench_startup(counts: List[int], repeat: int) -> List[Dict]:
+    """ Compare eager JSON loading with lazy line-delimited loading
+
+    Both modes are timed up to the first User.get, and the peak of the
+    memory allocated meanwhile is traced once.
+    """
+    results = []
+    file_format = base.FORMAT
+    try:
+        for count in counts:
+            make_users(count)
+            some_id = next(iter(base.DATA["User"]))
+            for mode, fmt in (("eager", "json"), ("lazy", "jsonl")):
+                base.FORMAT = fmt
+                User.save_to_file()
+
+                def startup():
+                    """ Load the store and read one user
+                    """
+                    User.load_from_file()
+                    User.get(some_id)
+
+                duration = timed(startup, repeat)
+                base.DATA["User"] = {}
+                tracemalloc.start()
+                startup()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results.append({"mode": mode, "users": count,
+                                "startup_ms": duration,
+                                "peak_alloc_mb": peak / (1 << 20)})
+    finally:
+        base.FORMAT = file_format
+    return results
+
+
+def bench_hydrate(counts: List[int], repeat: int) -> List[Dict]:
+    """ Compare decoding and building objects through __init__ and in bulk
+    """
+    results = []
+    for count in counts:
+        make_users(count)
+        raw = json.dumps({obj_id: user.to_json(True) for obj_id, user
+                          in base.DATA["User"].items()})
+
+        def init_path():
+            """ Decode with json and build every object with __init__
+            """
+            for record in json.loads(raw).values():
+                User(**record)
+
+        def bulk_path():
+            """ Decode with the fastest decoder and hydrate in bulk
+            """
+            User.from_records(base.loads(raw).values())
+
+        for path, action in (("__init__", init_path),
+                             ("from_records", bulk_path)):
+            duration = timed(action, repeat) / 1000
+            results.append({"path": path, "users": count,
+                            "decoder": "json" if path == "__init__" or
+                            base.orjson is None else "orjson",
+                            "objects_per_sec": count / duration})
+    return results
+
+
+def memory_probe(count: int) -> float:
+    """ Return the traced bytes per user of a store loaded from records
+
+    Records are decoded one by one while tracing, so each user is
+    charged for its own strings, and kept in a dict like DATA.
+    """
+    make_users(count)
+    lines = [json.dumps(user.to_json(True))
+             for user in base.DATA["User"].values()]
+    base.DATA["User"] = {}
+    tracemalloc.start()
+    store = {}
+    for line in lines:
+        user = User.from_record(json.loads(line))
+        store[user.id] = user
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / count
+
+
+def bench_memory(counts: List[int], repeat: int) -> List[Dict]:
+    """ Compare the bytes per user of the __dict__ and compact models
+
+    BASE_COMPACT is read when the models are imported, so each mode is
+    probed in a child process.
+    """
+    results = []
+    for count in counts:
+        for mode, compact in (("dict", "0"), ("slots", "1")):
+            env = dict(os.environ, BASE_COMPACT=compact)
+            output = subprocess.check_output(
+                [sys.executable, os.path.abspath(__file__),
+                 "--memory-probe", str(count)], env=env, text=True)
+            results.append({"mode": mode, "users": count,
+                            "bytes_per_object": float(output)})
+    return results
+
+
+def bench_concurrency(counts: List[int], repeat: int) -> List[Dict]:
+    """ Measure indexed search throughput with more and more reader threads
+    """
+    results = []
+    for count in counts:
+        make_users(count)
+        emails = [user.email for user in base.DATA["User"].values()]
+        for threads in (1, 2, 4, 8):
+            done = [0] * threads
+            stop = threading.Event()
+
+            def read(slot):
+                """ Search users by email until stopped
+                """
+                i = slot
+                while not stop.is_set():
+                    User.search({"email": emails[i % len(emails)]})
+                    i += threads
+                    done[slot] += 1
+
+            workers = [threading.Thread(target=read, args=(slot,))
+                       for slot in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            time.sleep(0.2 * repeat)
+            stop.set()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            results.append({"threads": threads, "users": count,
+                            "searches_per_sec": sum(done) / elapsed})
+    return results
+
+
+SUITES = {
+    "fsync": (bench_fsync,
+              "fsync={policy:<9} users={users:<8} "
+              "snapshot {snapshot_ms:>9.2f} ms  "
+              "journal append {journal_append_ms:>7.3f} ms"),
+    "startup": (bench_startup,
+                "startup={mode:<6} users={users:<8} "
+                "{startup_ms:>9.2f} ms  peak {peak_alloc_mb:>8.1f} MiB"),
+    "hydrate": (bench_hydrate,
+                "hydrate={path:<13} users={users:<8} decoder={decoder:<7}"
+                "{objects_per_sec:>12.0f} objects/sec"),
+    "memory": (bench_memory,
+               "memory={mode:<6} users={users:<8} "
+               "{bytes_per_object:>8.0f} bytes/object"),
+    "concurrency": (bench_concurrency,
+                    "readers={threads:<3} users={users:<8} "
+                    "{searches_per_sec:>12.0f} searches/sec"),
+}
+
+
+def main(argv: List[str] = None) -> None:
+    """ Parse the command line, run the benchmark and print the results
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("-n", "--users", default="1000,10000,100000",
+                        help="comma separated numbers of stored users")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-s", "--suite", action="append",
+                        choices=sorted(SUITES),
+                        help="only run this suite (repeatable)")
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    parser.add_argument("--memory-probe", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.memory_probe is not None:
+        print(memory_probe(args.memory_probe))
+        return
+
+    counts = [int(count) for count in args.users.split(",")]
+    output = args.output and os.path.abspath(args.output)
+    cwd = os.getcwd()
+    report = {"python": platform.python_version()}
+    for name in args.suite or sorted(SUITES):
+        bench, line = SUITES[name]
+        with tempfile.TemporaryDirectory(dir=cwd) as scratch:
+            os.chdir(scratch)
+            try:
+                report[name] = bench(counts, args.repeat)
+            finally:
+                os.chdir(cwd)
+        for result in report[name]:
+            print(line.format(**result))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,384 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import TypeVar, List, Iterable, Iterator, Tuple
+from os import getenv, path
+from models.storage import BACKENDS
+import atexit
 import json
+import mmap
+import os
+import threading
 import uuid
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
 DATA = {}
+INDEXES = {}
+JOURNAL = getenv("BASE_JOURNAL", "0") == "1"
+JOURNAL_MAX_BYTES = int(getenv("BASE_JOURNAL_MAX_BYTES", str(16 << 20)))
+FLUSH_INTERVAL = float(getenv("BASE_FLUSH_INTERVAL", "0"))
+FORMAT = getenv("BASE_FORMAT", "json")
+COMPACT = getenv("BASE_COMPACT", "0") == "1"
+FSYNC = getenv("BASE_FSYNC", "none")
+FSYNC_POLICIES = ("none", "file", "file+dir")
+if FSYNC not in FSYNC_POLICIES:
+    raise ValueError("BASE_FSYNC must be one of: {}".format(
+        ", ".join(FSYNC_POLICIES)))
+STORAGE = getenv("BASE_STORAGE", "file")
+if STORAGE != "file" and STORAGE not in BACKENDS:
+    raise ValueError("BASE_STORAGE must be one of: {}".format(
+        ", ".join(("file",) + tuple(BACKENDS))))
+BACKEND = None if STORAGE == "file" else BACKENDS[STORAGE]()
+
+_hydration_keys = {}
+_locks = {}
+_locks_guard = threading.Lock()
+_index_lock = threading.Lock()
+_dirty = {}
+_dirty_lock = threading.Lock()
+_units = ContextVar("unit_of_work_depth", default=0)
+_flusher = None
+
+
+class RWLock():
+    """ Lock shared by readers and held alone by a writer
+
+    Waiting writers go first: new readers queue behind them, so a steady
+    flow of searches cannot starve saves. The lock is not reentrant.
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked RWLock
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """ Hold the lock with other readers for the block
+        """
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """ Hold the lock alone for the block
+        """
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+def _class_locks(s_class: str) -> Tuple[RWLock, threading.RLock]:
+    """ Return the locks of a class in the file storage
+
+    The RWLock guards DATA and INDEXES: searches and reads share it,
+    while save, remove and load_from_file hold it alone. The RLock
+    serializes the writers of the class, from the change in DATA to the
+    write of the files, so that the files see changes in DATA order.
+    """
+    locks = _locks.get(s_class)
+    if locks is None:
+        with _locks_guard:
+            locks = _locks.setdefault(s_class,
+                                      (RWLock(), threading.RLock()))
+    return locks
+
+
+def flush():
+    """ Write every class saved or removed since the last flush
+
+    Each dirty class is written once: one snapshot, or one append of
+    all its pending records in journal mode.
+    """
+    with _dirty_lock:
+        classes = list(_dirty)
+    for cls in classes:
+        with _class_locks(cls.__name__)[1]:
+            cls._write_pending()
+
+
+@contextmanager
+def unit_of_work() -> Iterator[None]:
+    """ Defer the writes of save and remove until the block ends
+
+    Units of work can be nested; the dirty classes are flushed when the
+    outermost one ends, even if it ends with an exception, so that the
+    files stay in line with DATA. The depth is kept per thread (and per
+    asyncio task), so only the writes of the caller are deferred.
+    """
+    token = _units.set(_units.get() + 1)
+    try:
+        yield
+    finally:
+        _units.reset(token)
+        if not _units.get():
+            flush()
+
+
+def start_flusher(interval: float = FLUSH_INTERVAL) -> None:
+    """ Defer every write to a thread flushing on a fixed interval
+    """
+    global _flusher
+    if interval <= 0:
+        raise ValueError("flush interval must be positive")
+    with _dirty_lock:
+        if _flusher is not None:
+            return
+        stopped = threading.Event()
+
+        def run():
+            """ Flush the dirty classes until the flusher is stopped
+            """
+            while not stopped.wait(interval):
+                flush()
+
+        _flusher = threading.Thread(target=run, name="base-flusher",
+                                    daemon=True)
+        _flusher.stopped = stopped
+        _flusher.start()
+
+
+def stop_flusher() -> None:
+    """ Stop the background flusher and write what it left pending
+    """
+    global _flusher
+    with _dirty_lock:
+        flusher, _flusher = _flusher, None
+    if flusher is not None:
+        flusher.stopped.set()
+        flusher.join()
+    flush()
+
+
+def loads(data):
+    """ Decode JSON with orjson when it is installed, else with json
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _fsync_dir(file_path: str) -> None:
+    """ Make the last rename or creation in a directory durable
+    """
+    fd = os.open(path.dirname(path.abspath(file_path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(file_path: str, content: str) -> None:
+    """ Replace a file so that readers see either the old or new content
+
+    The content goes to a temporary file in the same directory, which
+    is renamed over the target. BASE_FSYNC picks how durable the result
+    is: "none" leaves it to the OS, "file" syncs the data before the
+    rename, and "file+dir" also syncs the rename itself.
+    """
+    tmp_path = "{}.{}-{}.tmp".format(file_path, os.getpid(),
+                                     threading.get_ident())
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+            if FSYNC != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if FSYNC == "file+dir":
+        _fsync_dir(file_path)
+
+
+atexit.register(stop_flusher)
+if FLUSH_INTERVAL > 0:
+    start_flusher()
+
+
+class _Index():
+    """ Hash index from the values of one attribute to object ids
+    """
+
+    def __init__(self):
+        """ Initialize an empty index
+        """
+        self.ids = {}
+        self.values = {}
+
+    def add(self, obj_id: str, value) -> None:
+        """ Index an object under the current value of the attribute
+
+        Unhashable values are left out: no hashable search value can
+        match them, and unhashable search values fall back to a scan.
+        """
+        self.discard(obj_id)
+        try:
+            self.ids.setdefault(value, {})[obj_id] = None
+        except TypeError:
+            return
+        self.values[obj_id] = value
+
+    def discard(self, obj_id: str) -> None:
+        """ Drop an object from the index
+        """
+        if obj_id not in self.values:
+            return
+        value = self.values.pop(obj_id)
+        ids = self.ids[value]
+        del ids[obj_id]
+        if not ids:
+            del self.ids[value]
+
+    def lookup(self, value) -> Iterable[str]:
+        """ Return the ids of the objects indexed under a value
+        """
+        return self.ids.get(value, ())
+
+
+class _LazyStore(MutableMapping):
+    """ Objects of one class loaded from a line-delimited snapshot
+
+    Each line of the snapshot is an id, a tab and the JSON record of the
+    object. Loading only maps the file and notes where every record
+    starts; a record is decoded into an object on first access.
+    """
+
+    def __init__(self, cls: type, data, offsets: dict):
+        """ Initialize the store over a mapped snapshot
+
+        ``offsets`` maps every id to the offset of its record in
+        ``data``, and keeps the order of the file.
+        """
+        self._cls = cls
+        self._data = data
+        self._items = offsets
+        self._lock = threading.Lock()
+
+    def raw(self, obj_id: str):
+        """ Return the record of an object not materialized yet, or None
+        """
+        start = self._items[obj_id]
+        if type(start) is not int:
+            return None
+        return self._data[start:self._data.find(b"\n", start)]
+
+    def peek(self, obj_id: str, attribute: str):
+        """ Read one attribute without materializing the object
+        """
+        record = self.raw(obj_id)
+        if record is None:
+            return getattr(self._items[obj_id], attribute, None)
+        return loads(record).get(attribute)
+
+    def __getitem__(self, obj_id: str):
+        """ Return an object, materializing it from its record if needed
+        """
+        obj = self._items[obj_id]
+        if type(obj) is int:
+            with self._lock:
+                obj = self._items[obj_id]
+                if type(obj) is int:
+                    record = loads(self.raw(obj_id))
+                    obj = self._cls.from_record(record)
+                    self._items[obj_id] = obj
+        return obj
+
+    def __setitem__(self, obj_id: str, obj):
+        """ Store an object
+        """
+        self._items[obj_id] = obj
+
+    def __delitem__(self, obj_id: str):
+        """ Drop an object
+        """
+        del self._items[obj_id]
+
+    def __iter__(self):
+        """ Iterate over the ids in file order
+        """
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        """ Count the objects, materialized or not
+        """
+        return len(self._items)
+
+
+def _map_lines(file_path: str, cls: type) -> _LazyStore:
+    """ Map a line-delimited snapshot and index the offsets of its records
+
+    Only the ids are decoded. A truncated last line is ignored.
+    """
+    offsets = {}
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return _LazyStore(cls, b"", offsets)
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    find = data.find
+    pos = 0
+    while pos < size:
+        tab = find(b"\t", pos)
+        end = find(b"\n", tab)
+        if tab == -1 or end == -1:
+            break
+        offsets[data[pos:tab].decode()] = tab + 1
+        pos = end + 1
+    return _LazyStore(cls, data, offsets)
 
 
 class Base():
     """ Base class
+
+    Subclasses list in ``indexed_attributes`` the attributes that
+    ``search`` looks up through a hash index instead of a full scan.
+    With BASE_COMPACT=1, Base itself has no instance dictionary, so that
+    CompactBase subclasses can live in __slots__ only.
     """
 
+    if COMPACT:
+        __slots__ = ()
+    indexed_attributes: Tuple[str, ...] = ()
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+        DATA.setdefault(s_class, {})
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
@@ -35,6 +392,47 @@ class Base():
         else:
             self.updated_at = datetime.utcnow()
 
+    @classmethod
+    def _record_keys(cls) -> Tuple[str, ...]:
+        """ Return the attributes __init__ sets, in the order it sets them
+
+        They are learnt once per class from a throwaway instance.
+        """
+        keys = _hydration_keys.get(cls)
+        if keys is None:
+            keys = _hydration_keys[cls] = tuple(cls().__dict__)
+        return keys
+
+    @classmethod
+    def from_record(cls, record: dict) -> TypeVar('Base'):
+        """ Build an object from a stored record without calling __init__
+
+        The result matches ``cls(**record)``, but timestamps go through
+        datetime.fromisoformat instead of strptime.
+        """
+        return cls.from_records((record,))[0]
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> List[TypeVar('Base')]:
+        """ Build objects from stored records, as load_from_file does
+        """
+        keys = cls._record_keys()
+        new = cls.__new__
+        parse = datetime.fromisoformat
+        objs = []
+        for record in records:
+            obj = new(cls)
+            state = {key: record.get(key) for key in keys}
+            if state['id'] is None and 'id' not in record:
+                state['id'] = str(uuid.uuid4())
+            for key in ('created_at', 'updated_at'):
+                value = state[key]
+                state[key] = datetime.utcnow() if value is None \
+                    else parse(value)
+            obj.__dict__.update(state)
+            objs.append(obj)
+        return objs
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -48,7 +446,7 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in self._fields():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,56 +455,258 @@ class Base():
                 result[key] = value
         return result
 
+    def _fields(self) -> Iterable[Tuple[str, object]]:
+        """ Return the stored attributes as (name, value) pairs
+        """
+        return self.__dict__.items()
+
     @classmethod
     def load_from_file(cls):
         """ Load all objects from file
+
+        The snapshot is read first, then the journal records written
+        since the last compaction are replayed on top of it. With
+        BASE_FORMAT=jsonl the objects are only materialized on access; a
+        JSON snapshot is still read when no line-delimited one exists
+        yet, and is converted by the next save. Writes still deferred
+        by a unit of work or the flusher are written out first, so that
+        reloading does not drop them.
         """
+        if BACKEND is not None:
+            return BACKEND.load(cls)
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        lines_path = ".db_{}.jsonl".format(s_class)
+        rwlock, writer = _class_locks(s_class)
+        with writer:
+            cls._write_pending()
+            if FORMAT == "jsonl" and path.exists(lines_path):
+                store = _map_lines(lines_path, cls)
+            elif path.exists(file_path):
+                with open(file_path, 'rb') as f:
+                    objs_json = loads(f.read())
+                store = dict(zip(objs_json,
+                                 cls.from_records(objs_json.values())))
+            else:
+                store = {}
+            with rwlock.write():
+                DATA[s_class] = store
+                INDEXES.pop(s_class, None)
+                torn = cls._replay_journal()
+            if torn:
+                cls.save_to_file()
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+
+        The snapshot is swapped in atomically (see write_atomic), then
+        the journal it compacts is removed.
         """
+        if BACKEND is not None:
+            return BACKEND.flush(cls)
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        rwlock, writer = _class_locks(s_class)
+        with writer:
+            if FORMAT == "jsonl":
+                file_path = ".db_{}.jsonl".format(s_class)
+                with rwlock.read():
+                    lines = cls._snapshot_lines()
+                content = "".join(lines)
+            else:
+                file_path = ".db_{}.json".format(s_class)
+                objs_json = {}
+                with rwlock.read():
+                    for obj_id, obj in DATA[s_class].items():
+                        objs_json[obj_id] = obj.to_json(True)
+                content = json.dumps(objs_json)
+
+            write_atomic(file_path, content)
+            journal_path = ".db_{}.journal".format(s_class)
+            if path.exists(journal_path):
+                os.remove(journal_path)
+
+    @classmethod
+    def _snapshot_lines(cls) -> List[str]:
+        """ Return all objects as one "id<TAB>record" line each
+
+        Records that were never materialized are copied as they are.
+        """
+        store = DATA[cls.__name__]
+        lazy = isinstance(store, _LazyStore)
+        lines = []
+        for obj_id in store:
+            record = store.raw(obj_id) if lazy else None
+            if record is None:
+                record = json.dumps(store[obj_id].to_json(True))
+            else:
+                record = record.decode()
+            lines.append("{}\t{}\n".format(obj_id, record))
+        return lines
+
+    @classmethod
+    def _replay_journal(cls) -> bool:
+        """ Apply the journal records to the objects loaded in DATA
+
+        A truncated last record, left by a crash in the middle of an
+        append, is ignored. A last record missing only its newline is
+        applied. True is returned in both cases: the journal must be
+        compacted so that the next appends do not land on its last line.
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        if not path.exists(journal_path):
+            return False
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record["op"] == "save":
+                    obj_json = record["obj"]
+                    DATA[s_class][obj_json["id"]] = cls.from_record(obj_json)
+                else:
+                    DATA[s_class].pop(record["id"], None)
+                if not line.endswith("\n"):
+                    break
+            else:
+                return False
+        return True
+
+    @classmethod
+    def _append_journal(cls, records: List[dict]):
+        """ Append records to the journal, compacting it when too big
+        """
+        journal_path = ".db_{}.journal".format(cls.__name__)
+        with _class_locks(cls.__name__)[1]:
+            created = not path.exists(journal_path)
+            with open(journal_path, 'a') as f:
+                f.write("".join(json.dumps(record) + "\n"
+                                for record in records))
+                if FSYNC != "none":
+                    f.flush()
+                    os.fsync(f.fileno())
+                size = f.tell()
+            if FSYNC == "file+dir" and created:
+                _fsync_dir(journal_path)
+            if size > JOURNAL_MAX_BYTES:
+                cls.save_to_file()
+
+    @classmethod
+    def _write_pending(cls):
+        """ Write the saves and removes of the class deferred so far
+
+        Called with the writer lock of the class held.
+        """
+        with _dirty_lock:
+            records = _dirty.pop(cls, None)
+        if records is None:
+            return
+        if JOURNAL:
+            cls._append_journal(records)
+        else:
+            cls.save_to_file()
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def _persist(cls, record: dict = None):
+        """ Write a save or remove, or mark the class dirty if deferred
+
+        Records are only built and kept in journal mode; snapshots are
+        rebuilt from DATA when the class is flushed. Called with the
+        writer lock of the class held, so records still pending from a
+        unit of work of another thread are written first, in order.
+        """
+        with _dirty_lock:
+            if _units.get() or _flusher is not None:
+                records = _dirty.setdefault(cls, [])
+                if JOURNAL:
+                    records.append(record)
+                return
+            records = _dirty.pop(cls, [])
+        if JOURNAL:
+            records.append(record)
+            cls._append_journal(records)
+        else:
+            cls.save_to_file()
+
+    @classmethod
+    def _index(cls, attribute: str) -> _Index:
+        """ Return the index of an attribute, building it on first use
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.setdefault(s_class, {})
+        index = indexes.get(attribute)
+        if index is not None:
+            return index
+        with _index_lock:
+            index = indexes.get(attribute)
+            if index is not None:
+                return index
+            index = _Index()
+            store = DATA[s_class]
+            if isinstance(store, _LazyStore):
+                for obj_id in list(store):
+                    index.add(obj_id, store.peek(obj_id, attribute))
+            else:
+                for obj_id, obj in list(store.items()):
+                    index.add(obj_id, getattr(obj, attribute, None))
+            indexes[attribute] = index
+        return index
+
+    def _reindex(self, removed: bool = False):
+        """ Update the built indexes of the class after a save or remove
+        """
+        indexes = INDEXES.get(self.__class__.__name__)
+        if not indexes:
+            return
+        for attribute, index in indexes.items():
+            if removed:
+                index.discard(self.id)
+            else:
+                index.add(self.id, getattr(self, attribute, None))
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        if BACKEND is not None:
+            return BACKEND.save(self)
+        rwlock, writer = _class_locks(s_class)
+        with writer:
+            with rwlock.write():
+                DATA[s_class][self.id] = self
+                self._reindex()
+            self.__class__._persist({"op": "save",
+                                     "obj": self.to_json(True)}
+                                    if JOURNAL else None)
 
     def remove(self):
         """ Remove object
         """
+        if BACKEND is not None:
+            return BACKEND.remove(self)
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        rwlock, writer = _class_locks(s_class)
+        with writer:
+            with rwlock.write():
+                if self.id not in DATA[s_class]:
+                    return
+                del DATA[s_class][self.id]
+                self._reindex(removed=True)
+            self.__class__._persist({"op": "remove", "id": self.id}
+                                    if JOURNAL else None)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
+        if BACKEND is not None:
+            return BACKEND.count(cls)
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        with _class_locks(s_class)[0].read():
+            return len(DATA[s_class].keys())
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,8 +718,11 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
+        if BACKEND is not None:
+            return BACKEND.get(cls, id)
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        with _class_locks(s_class)[0].read():
+            return DATA[s_class].get(id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
@@ -131,6 +734,8 @@ class Base():
         Returns:
             List[Base]: A list of objects matching the provided attributes.
         """
+        if BACKEND is not None:
+            return BACKEND.search(cls, attributes)
 
         # Get the name of the class
         s_class = cls.__name__
@@ -155,5 +760,111 @@ class Base():
                     return False
             return True
 
-        # Filter the objects based on the search function and return the results
-        return list(filter(_search, DATA[s_class].values()))
+        # Readers share the class lock, so searches run concurrently
+        with _class_locks(s_class)[0].read():
+            # Narrow the candidates down with the id or an indexed attribute;
+            # they are still checked against every attribute below
+            objs = DATA[s_class].values()
+            if 'id' in attributes:
+                try:
+                    obj = DATA[s_class].get(attributes['id'])
+                except TypeError:
+                    obj = None
+                objs = [] if obj is None else [obj]
+            else:
+                for k in cls.indexed_attributes:
+                    if k not in attributes:
+                        continue
+                    try:
+                        ids = cls._index(k).lookup(attributes[k])
+                    except TypeError:
+                        continue
+                    objs = [DATA[s_class][obj_id] for obj_id in ids]
+                    break
+
+            # Filter the objects based on the search function and return
+            # the results
+            return list(filter(_search, objs))
+
+
+class CompactBase(Base):
+    """ Base of the models kept in __slots__ in compact mode
+
+    Subclasses list their own attributes in ``__slots__``. Timestamps
+    are stored as seconds since the epoch and only turned into datetime
+    objects when they are read, which with the slots brings a stored
+    object down to a fraction of its __dict__ size.
+    """
+
+    __slots__ = ('id', '_created_ts', '_updated_ts')
+    _slot_names: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        """ Collect the slots of the subclass and of its parents
+        """
+        super().__init_subclass__(**kwargs)
+        mro = cls.__mro__
+        cls._slot_names = tuple(
+            key for klass in reversed(mro[:mro.index(CompactBase)])
+            for key in klass.__dict__.get('__slots__', ()))
+
+    @property
+    def created_at(self) -> datetime:
+        """ Creation time, as a naive UTC datetime
+        """
+        return EPOCH + timedelta(seconds=self._created_ts)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        """ Store the creation time as epoch seconds
+        """
+        self._created_ts = (value - EPOCH).total_seconds()
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Last update time, as a naive UTC datetime
+        """
+        return EPOCH + timedelta(seconds=self._updated_ts)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        """ Store the last update time as epoch seconds
+        """
+        self._updated_ts = (value - EPOCH).total_seconds()
+
+    def _fields(self) -> Iterable[Tuple[str, object]]:
+        """ Return the stored attributes in the order of a __dict__ model
+        """
+        yield 'id', self.id
+        yield 'created_at', self.created_at
+        yield 'updated_at', self.updated_at
+        for key in self._slot_names:
+            yield key, getattr(self, key)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> List[TypeVar('Base')]:
+        """ Build objects from stored records, as load_from_file does
+        """
+        keys = cls._slot_names
+        new = cls.__new__
+        parse = datetime.fromisoformat
+        now = None
+        objs = []
+        for record in records:
+            obj = new(cls)
+            if 'id' in record:
+                obj.id = record['id']
+            else:
+                obj.id = str(uuid.uuid4())
+            created_at = record.get('created_at')
+            updated_at = record.get('updated_at')
+            if created_at is None or updated_at is None:
+                now = (datetime.utcnow() - EPOCH).total_seconds()
+            obj._created_ts = now if created_at is None else \
+                (parse(created_at) - EPOCH).total_seconds()
+            obj._updated_ts = now if updated_at is None else \
+                (parse(updated_at) - EPOCH).total_seconds()
+            for key in keys:
+                setattr(obj, key, record.get(key))
+            objs.append(obj)
+        return objs
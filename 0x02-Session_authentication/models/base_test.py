@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+""" Multi-threaded stress tests of the models storage
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from models import base
+from models.user import User
+
+THREADS = 8
+USERS_PER_THREAD = 100
+
+
+class TestRWLock(unittest.TestCase):
+    """ Behavior of the reader/writer lock
+    """
+
+    def test_readers_share_the_lock(self):
+        """ Readers all hold the lock at the same time
+        """
+        lock = base.RWLock()
+        barrier = threading.Barrier(THREADS, timeout=5)
+        errors = []
+
+        def read():
+            """ Wait inside the read lock for every other reader
+            """
+            with lock.read():
+                try:
+                    barrier.wait()
+                except threading.BrokenBarrierError as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=read) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_writer_excludes_readers(self):
+        """ A reader waits for the writer holding the lock
+        """
+        lock = base.RWLock()
+        entered = threading.Event()
+
+        def read():
+            """ Take the read lock and signal it
+            """
+            with lock.read():
+                entered.set()
+
+        with lock.write():
+            thread = threading.Thread(target=read)
+            thread.start()
+            self.assertFalse(entered.wait(0.2))
+        self.assertTrue(entered.wait(5))
+        thread.join()
+
+
+class TestBase(unittest.TestCase):
+    """ Plain Base objects
+    """
+
+    @unittest.skipIf(base.COMPACT, "Base has no instance dictionary")
+    def test_plain_base(self):
+        """ Base can be built and given attributes outside compact mode
+        """
+        obj = base.Base(id="1")
+        obj.name = "plain"
+        self.assertEqual(obj.to_json()["name"], "plain")
+
+
+class TestConcurrentStore(unittest.TestCase):
+    """ Saves, removes and searches from many threads at once
+    """
+
+    def setUp(self):
+        """ Run every test on an empty store in a scratch directory
+        """
+        self.cwd = os.getcwd()
+        self.scratch = tempfile.TemporaryDirectory()
+        os.chdir(self.scratch.name)
+        self.modes = (base.JOURNAL, base.FORMAT)
+        User.load_from_file()
+
+    def tearDown(self):
+        """ Restore the storage mode and working directory
+        """
+        base.stop_flusher()
+        base.JOURNAL, base.FORMAT = self.modes
+        os.chdir(self.cwd)
+        self.scratch.cleanup()
+
+    def hammer(self, writer):
+        """ Run writers and searching readers until the writers are done
+
+        Return the errors raised in any thread.
+        """
+        errors = []
+        done = threading.Event()
+
+        def guarded(target, *args):
+            """ Record the exceptions of a thread
+            """
+            try:
+                target(*args)
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            """ Search until every writer is done
+
+            Users with an even number are never removed, so once listed
+            they must always be found. Readers pause between passes like
+            request handlers, instead of holding the GIL all the time.
+            """
+            while not done.is_set():
+                users = User.all()
+                for user in users[::max(1, len(users) // 20)]:
+                    found = User.search({'email': user.email})
+                    if any(other.email != user.email for other in found):
+                        raise AssertionError("wrong match")
+                    kept = int(user.email.split("@")[0].split("-")[1]) % 2
+                    if not kept and user not in found:
+                        raise AssertionError("lost user {}".format(user.id))
+                User.count()
+                time.sleep(0.001)
+
+        readers = [threading.Thread(target=guarded, args=(read,))
+                   for _ in range(THREADS // 2)]
+        writers = [threading.Thread(target=guarded, args=(writer, i))
+                   for i in range(THREADS)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+        return errors
+
+    @staticmethod
+    def write(worker):
+        """ Create users and remove every other one
+        """
+        for i in range(USERS_PER_THREAD):
+            user = User(email="{}-{}@hbtn.io".format(worker, i))
+            user.save()
+            if i % 2:
+                user.remove()
+
+    def check_store(self, workers=range(THREADS)):
+        """ Compare DATA, the indexes and the files with the expected users
+        """
+        expected = {"{}-{}@hbtn.io".format(worker, i)
+                    for worker in workers
+                    for i in range(0, USERS_PER_THREAD, 2)}
+        self.assertEqual({user.email for user in User.all()}, expected)
+        for email in expected:
+            self.assertEqual(len(User.search({'email': email})), 1)
+        ids = set(base.DATA['User'])
+        User.load_from_file()
+        self.assertEqual(set(base.DATA['User']), ids)
+
+    def test_snapshots(self):
+        """ Concurrent writers and readers on JSON snapshots
+        """
+        base.JOURNAL = False
+        self.assertEqual(self.hammer(self.write), [])
+        self.check_store()
+
+    def test_journal(self):
+        """ Concurrent writers and readers on the journal
+        """
+        base.JOURNAL = True
+        self.assertEqual(self.hammer(self.write), [])
+        self.check_store()
+
+    def test_lazy_lines(self):
+        """ Concurrent materialization of a lazily loaded store
+        """
+        base.FORMAT = "jsonl"
+        with base.unit_of_work():
+            self.write(0)
+        User.load_from_file()
+        self.assertEqual(self.hammer(lambda worker: self.write(worker + 1)),
+                         [])
+        self.check_store(range(THREADS + 1))
+
+    def test_units_of_work_with_flusher(self):
+        """ Concurrent units of work while the flusher writes behind
+        """
+        base.JOURNAL = True
+        base.start_flusher(0.01)
+
+        def write(worker):
+            """ Write the users of a worker in one unit of work
+            """
+            with base.unit_of_work():
+                self.write(worker)
+
+        self.assertEqual(self.hammer(write), [])
+        base.stop_flusher()
+        self.check_store()
+
+    def test_unit_of_work_defers_only_its_thread(self):
+        """ Writes outside a unit of work open in another thread go out
+        """
+        base.JOURNAL = True
+        inside = threading.Event()
+        leave = threading.Event()
+
+        def write():
+            """ Hold a unit of work open until told to leave it
+            """
+            with base.unit_of_work():
+                User(email="a@hbtn.io").save()
+                inside.set()
+                leave.wait(5)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            self.assertTrue(inside.wait(5))
+            User(email="b@hbtn.io").save()
+            with open(".db_User.journal") as f:
+                journal = f.read()
+            self.assertIn("b@hbtn.io", journal)
+        finally:
+            leave.set()
+            thread.join()
+        User.load_from_file()
+        self.assertEqual(User.count(), 2)
+
+    def test_reload_keeps_deferred_writes(self):
+        """ Reloading a class writes its deferred saves out first
+        """
+        expected = 0
+        for journal in (False, True):
+            base.JOURNAL = journal
+            base.start_flusher(60)
+            for i in range(3):
+                User(email="{}-{}@hbtn.io".format(journal, i)).save()
+            User.load_from_file()
+            base.stop_flusher()
+            User.load_from_file()
+            expected += 3
+            self.assertEqual(User.count(), expected)
+            with base.unit_of_work():
+                User(email="{}-unit@hbtn.io".format(journal)).save()
+                User.load_from_file()
+            User.load_from_file()
+            expected += 1
+            self.assertEqual(User.count(), expected)
+
+    def test_journal_without_final_newline(self):
+        """ A last record missing its newline survives the next append
+        """
+        base.JOURNAL = True
+        User(email="a@hbtn.io").save()
+        with open(".db_User.journal") as f:
+            journal = f.read()
+        with open(".db_User.journal", "w") as f:
+            f.write(journal.rstrip("\n"))
+        User.load_from_file()
+        User(email="b@hbtn.io").save()
+        User.load_from_file()
+        self.assertEqual(User.count(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+""" Storage backends of the models
+"""
+from abc import ABC, abstractmethod
+from os import getenv
+from typing import List, Optional, Sequence, TypeVar
+import sqlite3
+import threading
+
+
+class Storage(ABC):
+    """ Interface of the backends that persist Base objects
+
+    Base forwards load_from_file, save_to_file, save, remove, count, get
+    and search to the backend selected by BASE_STORAGE. The built-in
+    JSON files need no backend object: BASE_STORAGE=file (the default)
+    keeps objects in DATA. A backend that leaves any method below
+    unimplemented raises TypeError when it is created.
+    """
+
+    @abstractmethod
+    def load(self, cls: type) -> None:
+        """ Prepare the storage of a class, as load_from_file
+        """
+
+    @abstractmethod
+    def flush(self, cls: type) -> None:
+        """ Make the stored objects of a class durable, as save_to_file
+        """
+
+    @abstractmethod
+    def save(self, obj: TypeVar('Base')) -> None:
+        """ Insert or replace an object
+        """
+
+    @abstractmethod
+    def remove(self, obj: TypeVar('Base')) -> None:
+        """ Delete an object, if it is stored
+        """
+
+    @abstractmethod
+    def count(self, cls: type) -> int:
+        """ Count the stored objects of a class
+        """
+
+    @abstractmethod
+    def get(self, cls: type, obj_id: str) -> Optional[TypeVar('Base')]:
+        """ Return one object by id, or None
+        """
+
+    @abstractmethod
+    def search(self, cls: type,
+               attributes: dict) -> List[TypeVar('Base')]:
+        """ Return the objects whose attributes equal the given values
+        """
+
+
+class SQLiteStorage(Storage):
+    """ Store every class in its own table of a SQLite database
+
+    The columns are the keys of ``to_json(True)``, with ``id`` as the
+    primary key and an index on every attribute of
+    ``indexed_attributes``. Each thread uses its own connection, and the
+    database runs in WAL mode so that several processes can share it.
+    """
+
+    def __init__(self, db_path: str = None):
+        """ Initialize the backend over a database file
+        """
+        if db_path is None:
+            db_path = getenv("BASE_SQLITE_PATH", ".db.sqlite3")
+        self.db_path = db_path
+        self._local = threading.local()
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """ Return the connection of the current thread
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _table(self, cls: type) -> Sequence[str]:
+        """ Create the table of a class if needed and return its columns
+        """
+        columns = self._columns.get(cls)
+        if columns is not None:
+            return columns
+        with self._lock:
+            columns = list(cls().to_json(True))
+            table = cls.__name__
+            conn = self._connection()
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS "{}" ({})'.format(
+                    table, ", ".join(
+                        '"{}"{}'.format(column, " PRIMARY KEY"
+                                        if column == "id" else "")
+                        for column in columns)))
+                for attribute in cls.indexed_attributes:
+                    conn.execute(
+                        'CREATE INDEX IF NOT EXISTS "{0}_{1}" '
+                        'ON "{0}" ("{1}")'.format(table, attribute))
+            self._columns[cls] = columns
+        return columns
+
+    def _select(self, cls: type, where: str = "",
+                params: Sequence = ()) -> List[TypeVar('Base')]:
+        """ Build the objects of the rows matching a WHERE clause
+        """
+        columns = self._table(cls)
+        rows = self._connection().execute('SELECT {} FROM "{}"{}'.format(
+            ", ".join('"{}"'.format(column) for column in columns),
+            cls.__name__, where), params)
+        return cls.from_records(dict(zip(columns, row)) for row in rows)
+
+    def load(self, cls: type) -> None:
+        """ Create the table and indexes of a class if needed
+        """
+        self._table(cls)
+
+    def flush(self, cls: type) -> None:
+        """ Nothing to do: every write is committed on its own
+        """
+
+    def save(self, obj: TypeVar('Base')) -> None:
+        """ Upsert the row of an object
+        """
+        columns = self._table(type(obj))
+        record = obj.to_json(True)
+        conn = self._connection()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO "{}" ({}) VALUES ({})'.format(
+                type(obj).__name__,
+                ", ".join('"{}"'.format(column) for column in columns),
+                ", ".join("?" * len(columns))),
+                [record.get(column) for column in columns])
+
+    def remove(self, obj: TypeVar('Base')) -> None:
+        """ Delete the row of an object
+        """
+        self._table(type(obj))
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM "{}" WHERE id = ?'.format(
+                type(obj).__name__), (obj.id,))
+
+    def count(self, cls: type) -> int:
+        """ Count the rows of a class
+        """
+        self._table(cls)
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM "{}"'.format(cls.__name__)).fetchone()[0]
+
+    def get(self, cls: type, obj_id: str) -> Optional[TypeVar('Base')]:
+        """ Return the object of one row, or None
+        """
+        objs = self._select(cls, " WHERE id = ?", (obj_id,))
+        return objs[0] if objs else None
+
+    def search(self, cls: type,
+               attributes: dict) -> List[TypeVar('Base')]:
+        """ Select the rows matching the stored attributes of the query
+
+        Attributes that are not columns, or values SQLite cannot bind,
+        are checked on the built objects instead.
+        """
+        columns = self._table(cls)
+        clauses = []
+        params = []
+        remaining = {}
+        for key, value in attributes.items():
+            if key not in columns:
+                remaining[key] = value
+            elif value is None:
+                clauses.append('"{}" IS NULL'.format(key))
+            elif isinstance(value, (str, int, float)):
+                clauses.append('"{}" = ?'.format(key))
+                params.append(value)
+            else:
+                remaining[key] = value
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        objs = self._select(cls, where, params)
+        return [obj for obj in objs
+                if all(getattr(obj, key) == value
+                       for key, value in remaining.items())]
+
+
+BACKENDS = {"sqlite": SQLiteStorage}
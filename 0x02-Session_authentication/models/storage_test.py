@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+""" Tests of the SQLite storage backend through the models
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from models import base
+from models.storage import SQLiteStorage
+from models.user import User
+from models.user_session import UserSession
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    """ User and UserSession stored in a SQLite database
+    """
+
+    def setUp(self):
+        """ Point the models to a database in a scratch directory
+        """
+        self.scratch = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.scratch.name, "test.sqlite3")
+        self.backend = base.BACKEND
+        base.BACKEND = SQLiteStorage(self.db_path)
+        User.load_from_file()
+        UserSession.load_from_file()
+
+    def tearDown(self):
+        """ Restore the storage backend
+        """
+        base.BACKEND = self.backend
+        self.scratch.cleanup()
+
+    @staticmethod
+    def make_user(email, first_name=None, last_name=None):
+        """ Save and return a user
+        """
+        user = User(email=email, first_name=first_name, last_name=last_name)
+        user.password = "pwd"
+        user.save()
+        return user
+
+    def test_save_and_get(self):
+        """ A saved user comes back with the same attributes
+        """
+        user = self.make_user("bob@hbtn.io", "Bob", "Dylan")
+        found = User.get(user.id)
+        self.assertEqual(found.to_json(True), user.to_json(True))
+        self.assertTrue(found.is_valid_password("pwd"))
+        self.assertIsNone(User.get("missing"))
+
+    def test_save_replaces(self):
+        """ Saving an object again updates its row
+        """
+        user = self.make_user("bob@hbtn.io", "Bob")
+        user.first_name = "Robert"
+        user.save()
+        self.assertEqual(User.count(), 1)
+        self.assertEqual(User.get(user.id).first_name, "Robert")
+
+    def test_search_indexed(self):
+        """ Search on an indexed attribute
+        """
+        bob = self.make_user("bob@hbtn.io")
+        self.make_user("al@hbtn.io")
+        self.assertEqual([user.id for user in
+                          User.search({'email': "bob@hbtn.io"})], [bob.id])
+        self.assertEqual(User.search({'email': "nobody@hbtn.io"}), [])
+
+    def test_search_not_indexed(self):
+        """ Search on stored attributes without an index
+        """
+        bob = self.make_user("bob@hbtn.io", "Bob", "Dylan")
+        self.make_user("al@hbtn.io", "Al", "Dylan")
+        self.assertEqual([user.id for user in
+                          User.search({'first_name': "Bob"})], [bob.id])
+        self.assertEqual(len(User.search({'last_name': "Dylan"})), 2)
+        self.assertEqual(len(User.search({})), 2)
+
+    def test_search_none(self):
+        """ A None value matches the objects without that attribute set
+        """
+        bob = self.make_user("bob@hbtn.io", "Bob")
+        self.make_user("al@hbtn.io", "Al", "Dylan")
+        self.assertEqual([user.id for user in
+                          User.search({'last_name': None})], [bob.id])
+
+    def test_search_not_a_column(self):
+        """ Attributes that are not columns are checked on the objects
+        """
+        bob = self.make_user("bob@hbtn.io", "Bob")
+        self.make_user("al@hbtn.io", "Al")
+        self.assertEqual([user.id for user in User.search(
+            {'password': bob.password, 'first_name': "Bob"})], [bob.id])
+
+    def test_remove_and_count(self):
+        """ Removed objects are no longer counted or found
+        """
+        bob = self.make_user("bob@hbtn.io")
+        al = self.make_user("al@hbtn.io")
+        self.assertEqual(User.count(), 2)
+        bob.remove()
+        self.assertEqual(User.count(), 1)
+        self.assertIsNone(User.get(bob.id))
+        self.assertEqual([user.id for user in User.all()], [al.id])
+        bob.remove()
+        self.assertEqual(User.count(), 1)
+
+    def test_reload(self):
+        """ A new backend on the same database sees the stored objects
+        """
+        bob = self.make_user("bob@hbtn.io", "Bob")
+        base.BACKEND = SQLiteStorage(self.db_path)
+        User.load_from_file()
+        User.save_to_file()
+        self.assertEqual(User.count(), 1)
+        self.assertEqual(User.get(bob.id).to_json(True), bob.to_json(True))
+
+    def test_user_session(self):
+        """ Sessions are found by session and user id, and removed
+        """
+        bob = self.make_user("bob@hbtn.io")
+        session = UserSession(user_id=bob.id, session_id="abc")
+        session.save()
+        self.assertEqual([s.id for s in
+                          UserSession.search({'session_id': "abc"})],
+                         [session.id])
+        self.assertEqual(len(UserSession.search({'user_id': bob.id})), 1)
+        session.remove()
+        self.assertEqual(UserSession.count(), 0)
+
+
+class TestOtherCompactMode(unittest.TestCase):
+    """ The same tests with the models built in the other BASE_COMPACT mode
+    """
+
+    @unittest.skipIf(os.environ.get("STORAGE_TEST_CHILD"),
+                     "already running in the other mode")
+    def test_other_compact_mode(self):
+        """ Run TestSQLiteStorage in a child process with BASE_COMPACT flipped
+
+        BASE_COMPACT is read when the models are imported.
+        """
+        env = dict(os.environ, STORAGE_TEST_CHILD="1",
+                   BASE_COMPACT="0" if base.COMPACT else "1")
+        result = subprocess.run(
+            [sys.executable, "-m", "unittest",
+             "models.storage_test.TestSQLiteStorage"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True)
+        self.assertEqual(result.returncode, 0, result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
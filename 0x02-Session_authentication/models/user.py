@@ -2,13 +2,17 @@
 """ User module
 """
 import hashlib
-from models.base import Base
+from models.base import COMPACT, Base, CompactBase
 
 
-class User(Base):
+class User(CompactBase if COMPACT else Base):
     """ User class
     """
 
+    if COMPACT:
+        __slots__ = ('email', '_password', 'first_name', 'last_name')
+    indexed_attributes = ('email',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
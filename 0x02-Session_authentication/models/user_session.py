@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 """ UserSession module"""
-from models.base import Base
+from models.base import COMPACT, Base, CompactBase
 from datetime import datetime
 
 
-class UserSession(Base):
+class UserSession(CompactBase if COMPACT else Base):
     """ UserSession model to store user sessions """
 
+    if COMPACT:
+        __slots__ = ('user_id', 'session_id')
+    indexed_attributes = ('session_id', 'user_id')
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize UserSession instance with user_id and session_id """
         super().__init__(*args, **kwargs)
@@ -22,4 +26,4 @@ class UserSession(Base):
     def remove(self):
         """ Remove the UserSession instance from the DATA dictionary """
         if hasattr(self, 'id'):
-            del DATA[UserSession.__name__][self.id]
+            super().remove()
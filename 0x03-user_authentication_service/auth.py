@@ -4,9 +4,211 @@ import bcrypt
 from db import DB
 from user import User
 from sqlalchemy.orm.exc import NoResultFound
-from typing import TypeVar, Union
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar, Union
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
+import time
 import uuid
 
+MIN_ROUNDS = 12
+MAX_ROUNDS = 16
+PROBE_ROUNDS = 6
+HASH_BUDGET_MS = 250
+
+_rounds = None
+_rounds_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _calibrate_rounds(budget_ms: float = None) -> int:
+    """Picks the highest bcrypt cost whose hash fits a latency budget.
+
+        Each extra round doubles the work, so a few cheap probe hashes
+        are enough to extrapolate the time of every higher cost.
+
+        Args:
+            budget_ms (float): The per-hash budget in milliseconds, read
+            from BCRYPT_HASH_BUDGET_MS by default.
+
+        Returns:
+            int: The cost, between MIN_ROUNDS and MAX_ROUNDS.
+
+        """
+    if budget_ms is None:
+        budget_ms = float(os.environ.get("BCRYPT_HASH_BUDGET_MS",
+                                         HASH_BUDGET_MS))
+    salt = bcrypt.gensalt(PROBE_ROUNDS)
+    probe = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        probe = min(probe, time.perf_counter() - start)
+    rounds = PROBE_ROUNDS
+    while rounds < MAX_ROUNDS and \
+            probe * 2 ** (rounds + 1 - PROBE_ROUNDS) * 1000 <= budget_ms:
+        rounds += 1
+    return max(MIN_ROUNDS, rounds)
+
+
+def _get_rounds() -> int:
+    """Returns the bcrypt cost for new hashes, calibrating it once.
+
+        Returns:
+            int: The calibrated cost.
+
+        """
+    global _rounds
+    if _rounds is None:
+        with _rounds_lock:
+            if _rounds is None:
+                _rounds = _calibrate_rounds()
+    return _rounds
+
+
+def _needs_rehash(hashed_password: bytes) -> bool:
+    """Checks if a hashed password uses a lower cost than new hashes.
+
+        A slower machine may calibrate a lower cost than the stored one;
+        such hashes are kept, so a password is never weakened by a rehash.
+
+        Args:
+            hashed_password (bytes): The stored hashed password.
+
+        Returns:
+            bool: True if the password should be hashed again.
+
+        """
+    try:
+        return int(hashed_password.split(b"$")[2]) < _get_rounds()
+    except (IndexError, ValueError):
+        return True
+
+
+class BcryptMetrics:
+    """Queue-wait and execution-time totals of the async bcrypt calls."""
+
+    def __init__(self):
+        """
+        Initializes empty totals.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears every total.
+        """
+        with self._lock:
+            self.count = 0
+            self.queue_wait_total = 0.0
+            self.queue_wait_max = 0.0
+            self.execution_total = 0.0
+            self.execution_max = 0.0
+
+    def record(self, queue_wait: float, execution: float) -> None:
+        """
+        Adds the timings of one bcrypt call.
+
+        Args:
+            queue_wait (float): Seconds spent waiting for a worker.
+            execution (float): Seconds spent in bcrypt.
+        """
+        with self._lock:
+            self.count += 1
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.execution_total += execution
+            self.execution_max = max(self.execution_max, execution)
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Returns the call count and the mean and max timings in seconds.
+
+        Returns:
+            dict: The current totals.
+        """
+        with self._lock:
+            count = self.count or 1
+            return {
+                "count": self.count,
+                "queue_wait_mean": self.queue_wait_total / count,
+                "queue_wait_max": self.queue_wait_max,
+                "execution_mean": self.execution_total / count,
+                "execution_max": self.execution_max,
+            }
+
+
+metrics = BcryptMetrics()
+
+
+def set_async_concurrency(workers: int) -> None:
+    """Sets how many bcrypt calls async logins run at once.
+
+        Calls already submitted finish on the previous executor.
+
+        Args:
+            workers (int): The size of the dedicated executor.
+
+        """
+    global _executor
+    with _executor_lock:
+        previous = _executor
+        _executor = ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix="bcrypt")
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+def _bcrypt_executor() -> ThreadPoolExecutor:
+    """Returns the executor dedicated to bcrypt calls from async code.
+
+        Its size, and so the number of concurrent bcrypt calls, comes
+        from set_async_concurrency, or else from BCRYPT_ASYNC_CONCURRENCY,
+        the CPU count by default.
+
+        Returns:
+            ThreadPoolExecutor: The executor.
+
+        """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(os.environ.get("BCRYPT_ASYNC_CONCURRENCY",
+                                             os.cpu_count() or 1))
+                _executor = ThreadPoolExecutor(max_workers=workers,
+                                               thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def _run_bcrypt(func: Callable[..., Any], *args: Any) -> Any:
+    """Runs a bcrypt call on the dedicated executor, timing it in metrics.
+
+        Args:
+            func (callable): The blocking function to run.
+            *args: Its arguments.
+
+        Returns:
+            Any: What the function returned.
+
+        """
+    submitted = time.perf_counter()
+
+    def timed() -> Any:
+        """Runs the call, timing the wait before it and the call itself."""
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            metrics.record(started - submitted,
+                           time.perf_counter() - started)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_executor(), timed)
+
 
 def _hash_password(password: str) -> bytes:
     """Hashes a password using the bcrypt algorithm.
@@ -18,10 +220,33 @@ def _hash_password(password: str) -> bytes:
             bytes: The hashed password as bytes.
 
         """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(_get_rounds())
     return bcrypt.hashpw(password.encode("utf-8"), salt)
 
 
+def _verify_password(hashed_password: bytes,
+                     password: str) -> Tuple[bool, Optional[bytes]]:
+    """Checks a password and hashes it again if its cost is outdated.
+
+        Only bcrypt runs here, so async logins can call it on the
+        dedicated executor and keep the database on their own thread.
+
+        Args:
+            hashed_password (bytes): The stored hashed password.
+            password (str): The password to check.
+
+        Returns:
+            tuple: Whether the password matches, and its new hash if the
+            stored one should be replaced, None otherwise.
+
+        """
+    if not bcrypt.checkpw(password.encode("utf-8"), hashed_password):
+        return False, None
+    if _needs_rehash(hashed_password):
+        return True, _hash_password(password)
+    return True, None
+
+
 def _generate_uuid() -> str:
     """
     Generates a random UUID.
@@ -39,9 +264,27 @@ class Auth:
         """
         Initializes an instance of the Auth class.
 
-        Sets the instance's _db attribute to an instance of the DB class.
+        Sets the instance's _db attribute to an instance of the DB class
+        and calibrates the bcrypt cost for this machine.
         """
         self._db = DB()
+        _get_rounds()
+
+    def _check_password(self, user: User, password: str) -> bool:
+        """
+        Checks a user's password, rehashing it if its cost is outdated.
+
+        Args:
+            user (User): The user whose password is checked.
+            password (str): The password to check.
+
+        Returns:
+            bool: True if the password matches, False otherwise.
+        """
+        valid, rehashed = _verify_password(user.hashed_password, password)
+        if rehashed is not None:
+            self._db.update_user(user.id, hashed_password=rehashed)
+        return valid
 
     def register_user(self, email: str, password: str) -> User:
         """
@@ -81,14 +324,40 @@ class Auth:
             user = self._db.find_user_by(email=email)
             if not user or user is None:
                 return False
-            if not bcrypt.checkpw(password.encode("utf-8"),
-                                  user.hashed_password):
+            if not self._check_password(user, password):
                 # raise ValueError("Invalid email or password")
                 return False
             return True
         except (NoResultFound, ValueError):
             return False
 
+    async def async_valid_login(self, email: str, password: str) -> bool:
+        """
+        Validates a user's login credentials without blocking the loop.
+
+        The user is looked up and updated on the calling thread, since
+        the database session is not thread-safe, and bcrypt runs on the
+        dedicated executor, its timings recorded in metrics.
+
+        Args:
+            email (str): The email of the user to validate.
+            password (str): The password of the user to validate.
+
+        Returns:
+            bool: True if the login is valid, False otherwise.
+        """
+        try:
+            user = self._db.find_user_by(email=email)
+        except (NoResultFound, ValueError):
+            return False
+        if not user:
+            return False
+        valid, rehashed = await _run_bcrypt(
+            _verify_password, user.hashed_password, password)
+        if rehashed is not None:
+            self._db.update_user(user.id, hashed_password=rehashed)
+        return valid
+
     def create_session(self, email: str) -> Union[str, None]:
         """
         Creates a new session for a user with the given email.
@@ -124,8 +393,7 @@ class Auth:
             user = self._db.find_user_by(email=email)
             if not user or user is None:
                 return None
-            if not bcrypt.checkpw(password.encode("utf-8"),
-                                  user.hashed_password):
+            if not self._check_password(user, password):
                 return None
             return user
         except NoResultFound: